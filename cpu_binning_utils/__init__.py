@@ -6,6 +6,10 @@ from .cpu_pinning import (
     cpuset_string_excluding,
     get_no_hyper_threading_cpu_ranges,
     get_physical_core0_cpus,
+    get_second_thread_cpus,
+    get_thread_siblings,
+    get_usable_cpus,
+    parse_cpu_list,
     split_cpu_range,
 )
 
@@ -15,5 +19,9 @@ __all__ = [
     "cpuset_string_excluding",
     "get_no_hyper_threading_cpu_ranges",
     "get_physical_core0_cpus",
+    "get_second_thread_cpus",
+    "get_thread_siblings",
+    "get_usable_cpus",
+    "parse_cpu_list",
     "split_cpu_range",
 ]
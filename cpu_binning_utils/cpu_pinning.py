@@ -6,6 +6,10 @@ These functions help with:
 - Excluding system cores (physical core 0) from workloads
 """
 
+import functools
+import os
+from typing import Optional, Sequence
+
 
 def calculate_cpu_ranges(
     total_cpus: int, num_instances: int
@@ -39,14 +43,85 @@ def calculate_cpu_ranges(
     return ranges
 
 
+def get_usable_cpus() -> list[int]:
+    """Return the sorted logical CPU ids this process may run on.
+
+    Inside a cgroup cpuset, a ``taskset`` or an HPC allocation this is the
+    kernel-enforced affinity mask, which can be smaller than (and not start
+    at the same id as) the host's ``os.cpu_count()``. Falls back to
+    ``0..cpu_count-1`` on platforms without ``sched_getaffinity``.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 0))
+
+
+def parse_cpu_list(text: str) -> list[int]:
+    """Expand a kernel CPU list such as "0-3,8,10-11" into CPU ids.
+
+    Args:
+        text: CPU list in the format used by sysfs and cpuset
+
+    Returns:
+        The listed CPU ids in order
+    """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+@functools.cache
+def get_thread_siblings(cpu: int) -> frozenset[int]:
+    """Read the logical CPUs sharing a physical core with ``cpu`` from sysfs.
+
+    The topology does not change while we run, so each CPU is read once.
+    Raises OSError if the topology is not available (non-Linux, offline CPU).
+    """
+    with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+        return frozenset(parse_cpu_list(f.read()))
+
+
 def get_physical_core0_cpus() -> set[int]:
     """Read logical CPUs tied to physical core 0 from sysfs.
 
     Physical core 0 typically handles system interrupts, so it's often
     beneficial to exclude it from CPU-intensive workloads.
     """
-    with open("/sys/devices/system/cpu/cpu0/topology/thread_siblings_list") as f:
-        return set(int(c) for c in f.read().strip().split(","))
+    return set(get_thread_siblings(0))
+
+
+def get_second_thread_cpus(cpus: Sequence[int]) -> Optional[list[int]]:
+    """Pick one logical CPU per physical core using the sysfs topology.
+
+    For each physical core among ``cpus`` this keeps its highest-numbered
+    sibling, i.e. the second logical core on SMT systems, whether siblings
+    are interleaved (0,1) or strided (0,N/2). Cores without SMT keep their
+    only CPU.
+
+    Args:
+        cpus: Candidate logical CPU ids
+
+    Returns:
+        The chosen CPU ids in ascending order, or None if the topology
+        could not be read
+    """
+    candidates = set(cpus)
+    seen: set[int] = set()
+    chosen = []
+    try:
+        for cpu in sorted(candidates):
+            if cpu in seen:
+                continue
+            siblings = (get_thread_siblings(cpu) & candidates) or {cpu}
+            seen.update(siblings)
+            chosen.append(max(siblings))
+    except OSError:
+        return None
+    return sorted(chosen)
 
 
 def cpuset_string(start_cpu: int, end_cpu: int) -> str:
@@ -64,20 +139,31 @@ def cpuset_string(start_cpu: int, end_cpu: int) -> str:
     return f"{start_cpu}-{end_cpu}"
 
 
-def cpuset_string_excluding(start_cpu: int, end_cpu: int, exclude: set[int]) -> str:
+def cpuset_string_excluding(
+    start_cpu: int,
+    end_cpu: int,
+    exclude: set[int],
+    cpu_ids: Optional[Sequence[int]] = None,
+) -> str:
     """Generate a cpuset string excluding specific cores.
 
     Args:
         start_cpu: Starting CPU index (inclusive)
         end_cpu: Ending CPU index (inclusive)
-        exclude: Set of CPU indices to exclude
+        exclude: Set of CPU ids to exclude
+        cpu_ids: Optional CPU ids that the indices refer to (e.g. from
+            get_usable_cpus); by default an index is the CPU id itself
 
     Returns:
         A cpuset string with excluded cores removed, like "1,2,4,5"
     """
-    cpus = [c for c in range(start_cpu, end_cpu + 1) if c not in exclude]
-    if not cpus:
-        return cpuset_string(start_cpu, end_cpu)
+    if cpu_ids is None:
+        cpus = [c for c in range(start_cpu, end_cpu + 1) if c not in exclude]
+        if not cpus:
+            return cpuset_string(start_cpu, end_cpu)
+    else:
+        selected = cpu_ids[start_cpu : end_cpu + 1]
+        cpus = [c for c in selected if c not in exclude] or selected
     return ",".join(str(c) for c in cpus)
 
 
@@ -103,8 +189,10 @@ def get_no_hyper_threading_cpu_ranges(
     """Calculate CPU core ranges using only second logical cores (no hyperthreading).
 
     On systems with hyperthreading, this uses only the latter half of all available
-    CPU cores, which corresponds to the second logical core of each physical core.
-    The first logical cores are ignored to avoid hyperthreading interference.
+    CPU cores, which corresponds to the second logical core of each physical core
+    when siblings are strided (0,N/2). The first logical cores are ignored to avoid
+    hyperthreading interference. Prefer get_second_thread_cpus where sysfs is
+    available; this is the fallback when the topology cannot be read.
 
     Args:
         total_cpus: Total number of logical CPUs on the system
@@ -12,30 +12,134 @@ Enhancements:
 """
 
 import argparse
+import functools
+import json
+import multiprocessing
 import os
-import re
+import queue
+import shutil
+import tempfile
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Optional
+from types import MappingProxyType
+from typing import NamedTuple, Optional
 
-import yaml
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
 
 from cpu_binning_utils import (
     calculate_cpu_ranges,
     cpuset_string_excluding,
     get_no_hyper_threading_cpu_ranges,
     get_physical_core0_cpus,
+    get_second_thread_cpus,
+    get_usable_cpus,
+    parse_cpu_list,
     split_cpu_range,
 )
 
+# Host paths derived from the project checkout; identical for every instance.
+_PROJECT_ROOT = str(Path(__file__).resolve().parent)
+_CAMERA_DIR = f"{_PROJECT_ROOT}/camera"
+_CAMERA_PACKAGE_JSON_HOST = f"{_CAMERA_DIR}/package.json"
+_EPISODE_STARTER_HOST = f"{_CAMERA_DIR}/episode_starter.js"
+# Server assets copied into every instance's data dir before it starts
+_SERVER_ASSET_DIRS = ("plugins", "skins")
+
+# Literals shared by many services in every generated compose file.
+_BASE_IMAGE = "ojmichel/mc-multiplayer-base:latest"
+_CAMERA_IMAGE = "ojmichel/mineflayer-spectator-client:latest"
+_CAMERA_IMAGE_GPU = "ojmichel/mineflayer-spectator-client:gpu"
+_HOST_DOCKER = "host.docker.internal"
+_HOST_GATEWAY = f"{_HOST_DOCKER}:host-gateway"
+# The server and every client that talks to it must agree on these
+_MC_VERSION = "1.21"
+_RCON_PASSWORD = "research"
+
+# Fully static service fragments, identical for every instance.
+_MC_HEALTHCHECK_TIMING = {"interval": "10s", "timeout": "5s", "retries": 12}
+_EPISODE_STARTER_ENV = {
+    "EPISODE_START_RETRIES": "300",
+    "EPISODE_REQUIRED_PLAYERS": "Alpha,CameraAlpha,Bravo,CameraBravo,SpectatorAlpha,SpectatorBravo",
+    "EPISODE_START_COMMAND": "episode start Alpha CameraAlpha technoblade.png Bravo CameraBravo test.png",
+}
+_EPISODE_STARTER_SCRIPT = "npm install --omit=dev --no-progress && node episode_starter.js"
+# Per-run env skeletons. None entries are filled per instance (or per camera)
+# and only reserve their position in the emitted YAML.
+_MC_SERVER_ENV = {
+    # Base server env, common to both normal and flat worlds
+    "EULA": "TRUE",
+    "VERSION": _MC_VERSION,
+    "TYPE": "PAPER",
+    "MODE": "survival",
+    "RCON_PORT": None,
+    "SERVER_PORT": None,
+    "ALLOW_FLIGHT": True,
+    "ONLINE_MODE": False,
+    "SPAWN_PROTECTION": 0,
+    "SEED": None,
+    "ENFORCE_SECURE_PROFILE": False,
+    # Keep our trusted accounts OP'd across generated stacks
+    "OPS": "Pengulu,Ahrae,timwm",
+    "RCON_PASSWORD": _RCON_PASSWORD,
+    "BROADCAST_RCON_TO_OPS": True,
+}
+_CAMERA_ENV = {
+    "MC_VERSION": _MC_VERSION,
+    "MC_HOST": "127.0.0.1",
+    "MC_PORT": None,
+    "CAMERA_NAME": None,
+    "DISPLAY": None,
+    "VNC_PORT": None,
+    "NOVNC_PORT": None,
+    "WIDTH": "1280",
+    "HEIGHT": "720",
+    "FPS": "20",
+    "VNC_PASSWORD": "research",
+    "ENABLE_RECORDING": "1",
+    "RECORDING_PATH": None,
+    "RENDER_DISTANCE": None,
+    "SIMULATION_DISTANCE": None,
+    "GRAPHICS_MODE": None,
+}
+# Extra mc server env per world type; GENERATOR_SETTINGS is filled per instance
+_FLAT_WORLD_ENV = {
+    "LEVEL_TYPE": "minecraft:flat",
+    "GENERATOR_SETTINGS": None,
+}
+_FLAT_WORLD_ENV_NO_STRUCTURES = {**_FLAT_WORLD_ENV, "GENERATE_STRUCTURES": "false"}
+_NORMAL_WORLD_ENV = {}
+
 
 def absdir(path: str) -> str:
-    """Validate path is absolute and return it.
+    """Validate path is absolute and return it normalized.
 
     Raises AssertionError if not absolute to avoid ambiguous mounts.
+    Normalizing drops trailing slashes so per-instance paths can be built
+    with plain ``f"{base}/{instance_id}"`` formatting.
     """
     assert os.path.isabs(path), f"expected absolute path, got: {path}"
-    return path
+    return os.path.normpath(path)
+
+
+class CameraPaths(NamedTuple):
+    alpha_output_host: str
+    bravo_output_host: str
+    alpha_data_host: str
+    bravo_data_host: str
+
+
+class CameraPorts(NamedTuple):
+    alpha_vnc: int
+    alpha_novnc: int
+    bravo_vnc: int
+    bravo_novnc: int
+    alpha_display: str
+    bravo_display: str
 
 
 def camera_paths(
@@ -44,13 +148,13 @@ def camera_paths(
     bravo_base: str,
     data_alpha_base: str,
     data_bravo_base: str,
-) -> dict:
-    return {
-        "alpha_output_host": os.path.join(alpha_base, str(instance_id)),
-        "bravo_output_host": os.path.join(bravo_base, str(instance_id)),
-        "alpha_data_host": os.path.join(data_alpha_base, str(instance_id)),
-        "bravo_data_host": os.path.join(data_bravo_base, str(instance_id)),
-    }
+) -> CameraPaths:
+    return CameraPaths(
+        alpha_output_host=f"{alpha_base}/{instance_id}",
+        bravo_output_host=f"{bravo_base}/{instance_id}",
+        alpha_data_host=f"{data_alpha_base}/{instance_id}",
+        bravo_data_host=f"{data_bravo_base}/{instance_id}",
+    )
 
 
 def camera_ports(
@@ -62,15 +166,35 @@ def camera_ports(
     display_base: int,
     vnc_step: int,
     display_step: int,
-) -> dict:
-    return {
-        "alpha_vnc": alpha_vnc_base + vnc_step * instance_id,
-        "alpha_novnc": alpha_novnc_base + vnc_step * instance_id,
-        "bravo_vnc": bravo_vnc_base + vnc_step * instance_id,
-        "bravo_novnc": bravo_novnc_base + vnc_step * instance_id,
-        "alpha_display": f":{display_base + display_step * instance_id}",
-        "bravo_display": f":{display_base + display_step * instance_id + 1}",
-    }
+) -> CameraPorts:
+    vnc_offset = vnc_step * instance_id
+    display = display_base + display_step * instance_id
+    return CameraPorts(
+        alpha_vnc=alpha_vnc_base + vnc_offset,
+        alpha_novnc=alpha_novnc_base + vnc_offset,
+        bravo_vnc=bravo_vnc_base + vnc_offset,
+        bravo_novnc=bravo_novnc_base + vnc_offset,
+        alpha_display=f":{display}",
+        bravo_display=f":{display + 1}",
+    )
+
+
+def check_port_collisions(bases: dict, step: int, count: int) -> None:
+    """Assert that the per-instance port progressions never share a port.
+
+    Each entry in ``bases`` describes the progression ``base + step * i`` for
+    ``i in range(count)``. Two progressions with the same step collide only if
+    their bases differ by a multiple of ``step`` that is reachable within
+    ``count`` instances, so this is O(len(bases)^2) regardless of ``count``.
+    """
+    assert step > 0, f"vnc_step must be positive, got: {step}"
+    names = list(bases)
+    for a_idx, a in enumerate(names):
+        for b in names[a_idx + 1 :]:
+            diff = abs(bases[a] - bases[b])
+            assert not (
+                diff % step == 0 and diff // step < count
+            ), f"{a} and {b} port collisions detected"
 
 
 def generate_terrain_settings(biome, surface_block):
@@ -87,6 +211,77 @@ def generate_terrain_settings(biome, surface_block):
     return terrain_settings
 
 
+# Flat-world terrains, assigned to flat instances round-robin by instance id
+_FLAT_TERRAINS = (
+    ("plains", "grass_block"),
+    ("windswept_hills", "grass_block"),
+    ("snowy_plains", "snow"),
+    ("desert", "sand"),
+    ("desert", "red_sand"),
+)
+# Compact GENERATOR_SETTINGS JSON for each entry of _FLAT_TERRAINS
+_FLAT_GENERATOR_SETTINGS = tuple(
+    json.dumps(generate_terrain_settings(biome, surface_block), separators=(",", ":"))
+    for biome, surface_block in _FLAT_TERRAINS
+)
+
+
+@functools.lru_cache(maxsize=None)
+def sender_env_template(
+    receiver_port,
+    coord_port,
+    num_episodes,
+    episode_start_id,
+    episode_types,
+    bootstrap_wait_time,
+    iterations_num_per_episode,
+    viewer_rendering_disabled,
+    smoke_test,
+    eval_time_set_day,
+) -> MappingProxyType:
+    """Sender environment shared by every instance of a run.
+
+    Per-instance keys are present with ``None`` values so that patching them
+    keeps the key order of the emitted YAML stable. The result is cached and
+    shared, so it is returned read-only; callers take a shallow ``dict()``
+    copy (every value is a scalar) before patching.
+    """
+    return MappingProxyType({
+        "BOT_NAME": None,
+        "OTHER_BOT_NAME": None,
+        "RECEIVER_HOST": None,
+        "RECEIVER_PORT": receiver_port,
+        "COORD_PORT": coord_port,
+        "OTHER_COORD_HOST": None,
+        "OTHER_COORD_PORT": coord_port,
+        "BOT_RNG_SEED": None,
+        "EPISODES_NUM": num_episodes,
+        "EPISODE_START_ID": episode_start_id,
+        "EPISODE_TYPES": episode_types,
+        "MC_HOST": _HOST_DOCKER,
+        "MC_PORT": None,
+        "RCON_HOST": _HOST_DOCKER,
+        "RCON_PORT": None,
+        "RCON_PASSWORD": _RCON_PASSWORD,
+        "BOOTSTRAP_WAIT_TIME": bootstrap_wait_time,
+        "ENABLE_CAMERA_WAIT": 1,
+        "CAMERA_READY_RETRIES": 300,
+        "CAMERA_READY_CHECK_INTERVAL": 2000,
+        "ITERATIONS_NUM_PER_EPISODE": iterations_num_per_episode,
+        "MC_VERSION": _MC_VERSION,
+        "VIEWER_RENDERING_DISABLED": viewer_rendering_disabled,
+        "VIEWER_RECORDING_INTERVAL": 50,
+        "WALK_TIMEOUT": 5,
+        "TELEPORT": 1,
+        "TELEPORT_RADIUS": None,
+        "WORLD_TYPE": None,
+        "SMOKE_TEST": smoke_test,
+        "INSTANCE_ID": None,
+        "OUTPUT_DIR": "/output",
+        "EVAL_TIME_SET_DAY": eval_time_set_day,
+    })
+
+
 def generate_compose_config(
     instance_id,
     base_port,
@@ -131,6 +326,10 @@ def generate_compose_config(
     eval_time_set_day: int = 0,
     # Flatland options
     flatland_world_disable_structures: bool = False,
+    # Flat world generator settings as JSON; defaults to plains/grass_block
+    generator_settings: Optional[str] = None,
+    # Seed base shared by every instance of a run; defaults to now
+    base_timestamp: Optional[int] = None,
 ):
     """Generate a Docker Compose configuration for a single instance."""
 
@@ -138,6 +337,19 @@ def generate_compose_config(
     mc_port = base_port + instance_id
     rcon_port = base_rcon_port + instance_id
 
+    # Service and network names, each referenced from several places below
+    network_name = f"mc_network_{instance_id}"
+    mc_service = f"mc_instance_{instance_id}"
+    sender_alpha_service = f"sender_alpha_instance_{instance_id}"
+    sender_bravo_service = f"sender_bravo_instance_{instance_id}"
+    receiver_alpha_service = f"receiver_alpha_instance_{instance_id}"
+    receiver_bravo_service = f"receiver_bravo_instance_{instance_id}"
+    camera_alpha_service = f"camera_alpha_instance_{instance_id}"
+    camera_bravo_service = f"camera_bravo_instance_{instance_id}"
+    episode_starter_service = f"episode_starter_instance_{instance_id}"
+    spectator_alpha_service = f"spectator_alpha_instance_{instance_id}"
+    spectator_bravo_service = f"spectator_bravo_instance_{instance_id}"
+
     # Directories - each instance gets its own data subdirectory
     data_dir = f"{data_dir_base}/{instance_id}"
 
@@ -159,399 +371,267 @@ def generate_compose_config(
         display_step,
     )
 
-    project_root = str(Path(__file__).resolve().parent)
-
-    entrypoint_host = os.path.join(project_root, "camera", "entrypoint.sh")
-    launch_host = os.path.join(project_root, "camera", "launch_minecraft.py")
-    camera_package_json_host = os.path.join(project_root, "camera", "package.json")
     # If the only episode type is turnToLookEval, use the fixed seed "solaris"
     if episode_types == "turnToLookEval" or episode_types == "turnToLookOppositeEval":
         seed = "solaris"
         print(f"turnToLookEval episode type passsed. Using fixed seed 'solaris' for all instances.")
     else:
-        seed = str(instance_id) + str(int(time.time()))
+        if base_timestamp is None:
+            base_timestamp = int(time.time())
+        seed = f"{instance_id}{base_timestamp}"
+    world_type_lc = str(world_type).lower()
+    if world_type_lc != "flat":
+        world_env = _NORMAL_WORLD_ENV
+    else:
+        if generator_settings is None:
+            generator_settings = _FLAT_GENERATOR_SETTINGS[0]
+        world_env = {
+            **(
+                _FLAT_WORLD_ENV_NO_STRUCTURES
+                if flatland_world_disable_structures
+                else _FLAT_WORLD_ENV
+            ),
+            "GENERATOR_SETTINGS": generator_settings,
+        }
+    # Clone the run-wide sender env and patch the per-instance fields; the
+    # alpha/bravo specific keys are overlaid below.
+    sender_env = dict(
+        sender_env_template(
+            receiver_port,
+            coord_port,
+            num_episodes,
+            episode_start_id,
+            episode_types,
+            bootstrap_wait_time,
+            iterations_num_per_episode,
+            viewer_rendering_disabled,
+            smoke_test,
+            eval_time_set_day,
+        )
+    )
+    sender_env.update(
+        BOT_RNG_SEED=str(12345 + instance_id),
+        MC_PORT=mc_port,
+        RCON_PORT=rcon_port,
+        WORLD_TYPE=world_type_lc,
+        INSTANCE_ID=instance_id,
+    )
+    # Optional fragments spliced into several services below
+    cpuset_kw = {"cpuset": cpuset} if cpuset else {}
+    cpuset_camera_alpha_kw = {"cpuset": cpuset_camera_alpha} if cpuset_camera_alpha else {}
+    cpuset_camera_bravo_kw = {"cpuset": cpuset_camera_bravo} if cpuset_camera_bravo else {}
+    gpu_env = (
+        {"NVIDIA_DRIVER_CAPABILITIES": "all", "NVIDIA_VISIBLE_DEVICES": gpu_device_id}
+        if enable_gpu and gpu_device_id is not None
+        else {}
+    )
+
+    # Subtrees repeated verbatim across services. They are shared by
+    # reference, so the dumper writes each once as an anchor and aliases it.
+    base_build = {"context": _PROJECT_ROOT, "dockerfile": "Dockerfile"}
+    camera_build = {
+        "context": _CAMERA_DIR,
+        "dockerfile": "Dockerfile.gpu" if enable_gpu else "Dockerfile",
+    }
+    mc_healthy = {mc_service: {"condition": "service_healthy"}}
+    output_volumes = [f"{output_dir}:/output"]
+    extra_hosts = [_HOST_GATEWAY]
+    networks = [network_name]
+
+    # Camera env shared by alpha/bravo; the per-camera None entries are
+    # overridden in each camera service.
+    camera_env = {
+        **_CAMERA_ENV,
+        "MC_PORT": mc_port,
+        "RENDER_DISTANCE": render_distance,
+        "SIMULATION_DISTANCE": simulation_distance,
+        "GRAPHICS_MODE": graphics_mode,
+        **gpu_env,
+    }
+    # Likewise for the receivers, which differ only in NAME
+    receiver_env = {
+        "PORT": receiver_port,
+        "NAME": None,
+        "INSTANCE_ID": instance_id,
+        "EPISODE_START_ID": episode_start_id,
+        "VIEWER_RENDERING_DISABLED": viewer_rendering_disabled,
+    }
+    spectator_env = {"MC_HOST": _HOST_DOCKER, "MC_PORT": mc_port}
     config = {
-        "networks": {f"mc_network_{instance_id}": {"driver": "bridge"}},
+        "networks": {network_name: {"driver": "bridge"}},
         "services": {
-            f"prep_data_instance_{instance_id}": {
-                "image": "busybox:latest",
-                "command": [
-                    "sh",
-                    "-c",
-                    "mkdir -p /data /data/plugins /data/skins && "
-                    "chmod 777 /data /data/plugins /data/skins && "
-                    'if [ -d /source_plugins ] && [ -n "$(ls -A /source_plugins 2>/dev/null)" ]; then '
-                    "  cp -r /source_plugins/. /data/plugins/; "
-                    "fi; "
-                    'if [ -d /source_skins ] && [ -n "$(ls -A /source_skins 2>/dev/null)" ]; then '
-                    "  cp -r /source_skins/. /data/skins/; "
-                    "fi; "
-                    "chmod -R 777 /data/plugins /data/skins",
-                ],
-                "volumes": [
-                    f"{data_dir}:/data",
-                    f"{project_root}/plugins:/source_plugins:ro",
-                    f"{project_root}/skins:/source_skins:ro",
-                ],
-                "restart": "no",
-            },
-            f"mc_instance_{instance_id}": {
-                "depends_on": {
-                    f"prep_data_instance_{instance_id}": {
-                        "condition": "service_completed_successfully"
-                    }
-                },
+            mc_service: {
                 "image": "itzg/minecraft-server",
                 "tty": True,
                 "network_mode": "host",
-                **({"cpuset": cpuset} if cpuset else {}),
-                "environment": (
-                    lambda: {
-                        # Base server env, common to both normal and flat worlds
-                        "EULA": "TRUE",
-                        "VERSION": "1.21",
-                        "TYPE": "PAPER",
-                        "MODE": "survival",
-                        "RCON_PORT": rcon_port,
-                        "SERVER_PORT": mc_port,
-                        "ALLOW_FLIGHT": True,
-                        "ONLINE_MODE": False,
-                        "SPAWN_PROTECTION": 0,
-                        "SEED": seed,
-                        "ENFORCE_SECURE_PROFILE": False,
-                        # Keep our trusted accounts OP'd across generated stacks
-                        "OPS": "Pengulu,Ahrae,timwm",
-                        "RCON_PASSWORD": "research",
-                        "BROADCAST_RCON_TO_OPS": True,
-                        **(
-                            {
-                                "LEVEL_TYPE": "minecraft:flat",
-                                "GENERATOR_SETTINGS": "TERRAIN_SETTINGS_PLACEHOLDER",
-                                **(
-                                    {"GENERATE_STRUCTURES": "false"}
-                                    if flatland_world_disable_structures
-                                    else {}
-                                ),
-                            }
-                            if str(world_type).lower() == "flat"
-                            else {}
-                        ),
-                    }
-                )(),
+                **cpuset_kw,
+                "environment": {
+                    **_MC_SERVER_ENV,
+                    "RCON_PORT": rcon_port,
+                    "SERVER_PORT": mc_port,
+                    "SEED": seed,
+                    **world_env,
+                },
                 "volumes": [f"{data_dir}:/data"],
                 "healthcheck": {
                     "test": [
                         "CMD-SHELL",
                         f"mc-monitor status --host localhost --port {mc_port}",
                     ],
-                    "interval": "10s",
-                    "timeout": "5s",
-                    "retries": 12,
+                    **_MC_HEALTHCHECK_TIMING,
                 },
             },
-            f"sender_alpha_instance_{instance_id}": {
-                "image": "ojmichel/mc-multiplayer-base:latest",
-                "build": {
-                    "context": project_root,
-                    "dockerfile": "Dockerfile",
-                },
+            sender_alpha_service: {
+                "image": _BASE_IMAGE,
+                "build": base_build,
                 "depends_on": {
-                    f"mc_instance_{instance_id}": {"condition": "service_healthy"},
-                    f"receiver_alpha_instance_{instance_id}": {
-                        "condition": "service_started"
-                    },
+                    mc_service: {"condition": "service_healthy"},
+                    receiver_alpha_service: {"condition": "service_started"},
                 },
-                **({"cpuset": cpuset} if cpuset else {}),
-                "volumes": [f"{output_dir}:/output"],
+                **cpuset_kw,
+                "volumes": output_volumes,
                 "environment": {
+                    **sender_env,
                     "BOT_NAME": "Alpha",
                     "OTHER_BOT_NAME": "Bravo",
-                    "RECEIVER_HOST": f"receiver_alpha_instance_{instance_id}",
-                    "RECEIVER_PORT": receiver_port,
-                    "COORD_PORT": coord_port,
-                    "OTHER_COORD_HOST": f"sender_bravo_instance_{instance_id}",
-                    "OTHER_COORD_PORT": coord_port,
-                    "BOT_RNG_SEED": str(12345 + instance_id),
-                    "EPISODES_NUM": num_episodes,
-                    "EPISODE_START_ID": episode_start_id,
-                    "EPISODE_TYPES": episode_types,
-                    "MC_HOST": "host.docker.internal",
-                    "MC_PORT": mc_port,
-                    "RCON_HOST": "host.docker.internal",
-                    "RCON_PORT": rcon_port,
-                    "RCON_PASSWORD": "research",
-                    "BOOTSTRAP_WAIT_TIME": bootstrap_wait_time,
-                    "ENABLE_CAMERA_WAIT": 1,
-                    "CAMERA_READY_RETRIES": 300,
-                    "CAMERA_READY_CHECK_INTERVAL": 2000,
-                    "ITERATIONS_NUM_PER_EPISODE": iterations_num_per_episode,
-                    "MC_VERSION": "1.21",
-                    "VIEWER_RENDERING_DISABLED": viewer_rendering_disabled,
-                    "VIEWER_RECORDING_INTERVAL": 50,
-                    "WALK_TIMEOUT": 5,
-                    "TELEPORT": 1,
+                    "RECEIVER_HOST": receiver_alpha_service,
+                    "OTHER_COORD_HOST": sender_bravo_service,
                     "TELEPORT_RADIUS": 50000,
-                    "WORLD_TYPE": str(world_type).lower(),
-                    "SMOKE_TEST": smoke_test,
-                    "INSTANCE_ID": instance_id,
-                    "OUTPUT_DIR": "/output",
-                    "EVAL_TIME_SET_DAY": eval_time_set_day,
                 },
-                "extra_hosts": ["host.docker.internal:host-gateway"],
-                "networks": [f"mc_network_{instance_id}"],
+                "extra_hosts": extra_hosts,
+                "networks": networks,
                 "command": "./entrypoint_senders.sh",
             },
-            f"sender_bravo_instance_{instance_id}": {
-                "image": "ojmichel/mc-multiplayer-base:latest",
-                "build": {
-                    "context": project_root,
-                    "dockerfile": "Dockerfile",
-                },
+            sender_bravo_service: {
+                "image": _BASE_IMAGE,
+                "build": base_build,
                 "depends_on": {
-                    f"mc_instance_{instance_id}": {"condition": "service_healthy"},
-                    f"receiver_bravo_instance_{instance_id}": {
-                        "condition": "service_started"
-                    },
-                    f"sender_alpha_instance_{instance_id}": {
-                        "condition": "service_started"
-                    },
+                    mc_service: {"condition": "service_healthy"},
+                    receiver_bravo_service: {"condition": "service_started"},
+                    sender_alpha_service: {"condition": "service_started"},
                 },
-                **({"cpuset": cpuset} if cpuset else {}),
-                "volumes": [f"{output_dir}:/output"],
+                **cpuset_kw,
+                "volumes": output_volumes,
                 "environment": {
+                    **sender_env,
                     "BOT_NAME": "Bravo",
                     "OTHER_BOT_NAME": "Alpha",
-                    "RECEIVER_HOST": f"receiver_bravo_instance_{instance_id}",
-                    "RECEIVER_PORT": receiver_port,
-                    "COORD_PORT": coord_port,
-                    "OTHER_COORD_HOST": f"sender_alpha_instance_{instance_id}",
-                    "OTHER_COORD_PORT": coord_port,
-                    "BOT_RNG_SEED": str(12345 + instance_id),
-                    "EPISODES_NUM": num_episodes,
-                    "EPISODE_START_ID": episode_start_id,
-                    "EPISODE_TYPES": episode_types,
-                    "MC_HOST": "host.docker.internal",
-                    "MC_PORT": mc_port,
-                    "RCON_HOST": "host.docker.internal",
-                    "RCON_PORT": rcon_port,
-                    "RCON_PASSWORD": "research",
-                    "BOOTSTRAP_WAIT_TIME": bootstrap_wait_time,
-                    "ENABLE_CAMERA_WAIT": 1,
-                    "CAMERA_READY_RETRIES": 300,
-                    "CAMERA_READY_CHECK_INTERVAL": 2000,
-                    "ITERATIONS_NUM_PER_EPISODE": iterations_num_per_episode,
-                    "MC_VERSION": "1.21",
-                    "VIEWER_RENDERING_DISABLED": viewer_rendering_disabled,
-                    "VIEWER_RECORDING_INTERVAL": 50,
-                    "WALK_TIMEOUT": 5,
-                    "TELEPORT": 1,
+                    "RECEIVER_HOST": receiver_bravo_service,
+                    "OTHER_COORD_HOST": sender_alpha_service,
                     "TELEPORT_RADIUS": 250,
-                    "WORLD_TYPE": str(world_type).lower(),
-                    "SMOKE_TEST": smoke_test,
-                    "INSTANCE_ID": instance_id,
-                    "OUTPUT_DIR": "/output",
-                    "EVAL_TIME_SET_DAY": eval_time_set_day,
                 },
-                "extra_hosts": ["host.docker.internal:host-gateway"],
-                "networks": [f"mc_network_{instance_id}"],
+                "extra_hosts": extra_hosts,
+                "networks": networks,
                 "command": "./entrypoint_senders.sh",
             },
-            f"receiver_alpha_instance_{instance_id}": {
-                "image": "ojmichel/mc-multiplayer-base:latest",
-                "environment": {
-                    "PORT": receiver_port,
-                    "NAME": "Alpha",
-                    "INSTANCE_ID": instance_id,
-                    "EPISODE_START_ID": episode_start_id,
-                    "VIEWER_RENDERING_DISABLED": viewer_rendering_disabled,
-                },
+            receiver_alpha_service: {
+                "image": _BASE_IMAGE,
+                "environment": {**receiver_env, "NAME": "Alpha"},
                 "tty": True,
-                **({"cpuset": cpuset} if cpuset else {}),
-                "volumes": [f"{output_dir}:/output"],
-                "networks": [f"mc_network_{instance_id}"],
+                **cpuset_kw,
+                "volumes": output_volumes,
+                "networks": networks,
                 "command": "./entrypoint_receiver.sh",
             },
-            f"receiver_bravo_instance_{instance_id}": {
-                "image": "ojmichel/mc-multiplayer-base:latest",
-                "environment": {
-                    "PORT": receiver_port,
-                    "NAME": "Bravo",
-                    "INSTANCE_ID": instance_id,
-                    "EPISODE_START_ID": episode_start_id,
-                    "VIEWER_RENDERING_DISABLED": viewer_rendering_disabled,
-                },
+            receiver_bravo_service: {
+                "image": _BASE_IMAGE,
+                "environment": {**receiver_env, "NAME": "Bravo"},
                 "tty": True,
-                **({"cpuset": cpuset} if cpuset else {}),
-                "volumes": [f"{output_dir}:/output"],
-                "networks": [f"mc_network_{instance_id}"],
+                **cpuset_kw,
+                "volumes": output_volumes,
+                "networks": networks,
                 "command": "./entrypoint_receiver.sh",
             },
             # Camera alpha: recording client
-            f"camera_alpha_instance_{instance_id}": {
-                "image": "ojmichel/mineflayer-spectator-client:gpu" if enable_gpu else "ojmichel/mineflayer-spectator-client:latest",
-                "build": {
-                    "context": os.path.join(project_root, "camera"),
-                    "dockerfile": "Dockerfile.gpu" if enable_gpu else "Dockerfile",
-                },
+            camera_alpha_service: {
+                "image": _CAMERA_IMAGE_GPU if enable_gpu else _CAMERA_IMAGE,
+                "build": camera_build,
                 "restart": "unless-stopped",
                 "network_mode": "host",
-                **({"cpuset": cpuset_camera_alpha} if cpuset_camera_alpha else {}),
-                "depends_on": {
-                    f"mc_instance_{instance_id}": {"condition": "service_healthy"}
-                },
+                **cpuset_camera_alpha_kw,
+                "depends_on": mc_healthy,
                 "environment": {
-                    "MC_VERSION": "1.21",
-                    "MC_HOST": "127.0.0.1",
-                    "MC_PORT": mc_port,
+                    **camera_env,
                     "CAMERA_NAME": "CameraAlpha",
-                    "DISPLAY": cam_ports["alpha_display"],
-                    "VNC_PORT": str(cam_ports["alpha_vnc"]),
-                    "NOVNC_PORT": str(cam_ports["alpha_novnc"]),
-                    "WIDTH": "1280",
-                    "HEIGHT": "720",
-                    "FPS": "20",
-                    "VNC_PASSWORD": "research",
-                    "ENABLE_RECORDING": "1",
+                    "DISPLAY": cam_ports.alpha_display,
+                    "VNC_PORT": str(cam_ports.alpha_vnc),
+                    "NOVNC_PORT": str(cam_ports.alpha_novnc),
                     "RECORDING_PATH": "/output/camera_alpha.mkv",
-                    "RENDER_DISTANCE": render_distance,
-                    "SIMULATION_DISTANCE": simulation_distance,
-                    "GRAPHICS_MODE": graphics_mode,
-                    **(
-                        {
-                            "NVIDIA_DRIVER_CAPABILITIES": "all",
-                            "NVIDIA_VISIBLE_DEVICES": gpu_device_id,
-                        }
-                        if enable_gpu and gpu_device_id is not None
-                        else {}
-                    ),
                 },
                 "runtime": "nvidia",
                 "volumes": [
-                    f"{cam_paths['alpha_data_host']}:/root",
-                    f"{cam_paths['alpha_output_host']}:/output",
+                    f"{cam_paths.alpha_data_host}:/root",
+                    f"{cam_paths.alpha_output_host}:/output",
                 ],
             },
             # Episode starter: waits for all players then triggers episode start
-            f"episode_starter_instance_{instance_id}": {
+            episode_starter_service: {
                 "image": "node:20",
                 "network_mode": "host",
-                **({"cpuset": cpuset} if cpuset else {}),
+                **cpuset_kw,
                 "depends_on": {
-                    f"mc_instance_{instance_id}": {"condition": "service_healthy"},
-                    f"camera_alpha_instance_{instance_id}": {
-                        "condition": "service_started"
-                    },
+                    mc_service: {"condition": "service_healthy"},
+                    camera_alpha_service: {"condition": "service_started"},
                 },
                 "working_dir": "/app",
                 "environment": {
                     "RCON_HOST": "127.0.0.1",
                     "RCON_PORT": rcon_port,
-                    "RCON_PASSWORD": "research",
-                    "EPISODE_START_RETRIES": "300",
-                    "EPISODE_REQUIRED_PLAYERS": "Alpha,CameraAlpha,Bravo,CameraBravo,SpectatorAlpha,SpectatorBravo",
-                    "EPISODE_START_COMMAND": "episode start Alpha CameraAlpha technoblade.png Bravo CameraBravo test.png",
+                    "RCON_PASSWORD": _RCON_PASSWORD,
+                    **_EPISODE_STARTER_ENV,
                 },
                 "volumes": [
-                    f"{os.path.join(project_root, 'camera', 'episode_starter.js')}:/app/episode_starter.js:ro",
-                    f"{camera_package_json_host}:/app/package.json:ro",
-                ],
-                "command": [
-                    "sh",
-                    "-c",
-                    "npm install --omit=dev --no-progress && node episode_starter.js",
+                    f"{_EPISODE_STARTER_HOST}:/app/episode_starter.js:ro",
+                    f"{_CAMERA_PACKAGE_JSON_HOST}:/app/package.json:ro",
                 ],
+                "command": ["sh", "-c", _EPISODE_STARTER_SCRIPT],
             },
             # Camera bravo: recording client
-            f"camera_bravo_instance_{instance_id}": {
-                "image": "ojmichel/mineflayer-spectator-client:gpu" if enable_gpu else "ojmichel/mineflayer-spectator-client:latest",
-                "build": {
-                    "context": os.path.join(project_root, "camera"),
-                    "dockerfile": "Dockerfile.gpu" if enable_gpu else "Dockerfile",
-                },
+            camera_bravo_service: {
+                "image": _CAMERA_IMAGE_GPU if enable_gpu else _CAMERA_IMAGE,
+                "build": camera_build,
                 "restart": "unless-stopped",
                 "network_mode": "host",
-                **({"cpuset": cpuset_camera_bravo} if cpuset_camera_bravo else {}),
-                "depends_on": {
-                    f"mc_instance_{instance_id}": {"condition": "service_healthy"}
-                },
+                **cpuset_camera_bravo_kw,
+                "depends_on": mc_healthy,
                 "environment": {
-                    "MC_VERSION": "1.21",
-                    "MC_HOST": "127.0.0.1",
-                    "MC_PORT": mc_port,
+                    **camera_env,
                     "CAMERA_NAME": "CameraBravo",
-                    "DISPLAY": cam_ports["bravo_display"],
-                    "VNC_PORT": str(cam_ports["bravo_vnc"]),
-                    "NOVNC_PORT": str(cam_ports["bravo_novnc"]),
-                    "WIDTH": "1280",
-                    "HEIGHT": "720",
-                    "FPS": "20",
-                    "VNC_PASSWORD": "research",
-                    "ENABLE_RECORDING": "1",
+                    "DISPLAY": cam_ports.bravo_display,
+                    "VNC_PORT": str(cam_ports.bravo_vnc),
+                    "NOVNC_PORT": str(cam_ports.bravo_novnc),
                     "RECORDING_PATH": "/output/camera_bravo.mkv",
-                    "RENDER_DISTANCE": render_distance,
-                    "SIMULATION_DISTANCE": simulation_distance,
-                    "GRAPHICS_MODE": graphics_mode,
-                    **(
-                        {
-                            "NVIDIA_DRIVER_CAPABILITIES": "all",
-                            "NVIDIA_VISIBLE_DEVICES": gpu_device_id,
-                        }
-                        if enable_gpu and gpu_device_id is not None
-                        else {}
-                    ),
                 },
                 "runtime": "nvidia",
                 "volumes": [
-                    f"{cam_paths['bravo_data_host']}:/root",
-                    f"{cam_paths['bravo_output_host']}:/output",
+                    f"{cam_paths.bravo_data_host}:/root",
+                    f"{cam_paths.bravo_output_host}:/output",
                 ],
             },
             # Passive spectator alpha
-            f"spectator_alpha_instance_{instance_id}": {
-                "image": "ojmichel/mc-multiplayer-base:latest",
-                "build": {
-                    "context": project_root,
-                    "dockerfile": "Dockerfile",
-                },
+            spectator_alpha_service: {
+                "image": _BASE_IMAGE,
+                "build": base_build,
                 "restart": "unless-stopped",
-                **({"cpuset": cpuset} if cpuset else {}),
-                "depends_on": {
-                    f"mc_instance_{instance_id}": {"condition": "service_healthy"}
-                },
+                **cpuset_kw,
+                "depends_on": mc_healthy,
                 "working_dir": "/usr/src/app",
-                "environment": {
-                    "MC_HOST": "host.docker.internal",
-                    "MC_PORT": mc_port,
-                    "MC_USERNAME": "SpectatorAlpha",
-                },
-                "extra_hosts": [
-                    "host.docker.internal:host-gateway",
-                ],
-                "networks": [f"mc_network_{instance_id}"],
+                "environment": {**spectator_env, "MC_USERNAME": "SpectatorAlpha"},
+                "extra_hosts": extra_hosts,
+                "networks": networks,
                 "command": ["node", "spectator/spectator.js"],
             },
             # Passive spectator bravo
-            f"spectator_bravo_instance_{instance_id}": {
-                "image": "ojmichel/mc-multiplayer-base:latest",
-                "build": {
-                    "context": project_root,
-                    "dockerfile": "Dockerfile",
-                },
+            spectator_bravo_service: {
+                "image": _BASE_IMAGE,
+                "build": base_build,
                 "restart": "unless-stopped",
-                **({"cpuset": cpuset} if cpuset else {}),
-                "depends_on": {
-                    f"mc_instance_{instance_id}": {"condition": "service_healthy"}
-                },
+                **cpuset_kw,
+                "depends_on": mc_healthy,
                 "working_dir": "/usr/src/app",
-                "environment": {
-                    "MC_HOST": "host.docker.internal",
-                    "MC_PORT": mc_port,
-                    "MC_USERNAME": "SpectatorBravo",
-                },
-                "extra_hosts": [
-                    "host.docker.internal:host-gateway",
-                ],
-                "networks": [f"mc_network_{instance_id}"],
+                "environment": {**spectator_env, "MC_USERNAME": "SpectatorBravo"},
+                "extra_hosts": extra_hosts,
+                "networks": networks,
                 "command": ["node", "spectator/spectator.js"],
             },
         },
@@ -560,7 +640,329 @@ def generate_compose_config(
     return config
 
 
-def main():
+# Our uid; None where the platform has no uids (everything counts as ours)
+_OWN_UID = os.getuid() if hasattr(os, "getuid") else None
+
+
+def _make_world_writable(path: str, problems: list[str]) -> None:
+    """chmod 777 ``path`` if we own it (or are root); report failures.
+
+    Entries owned by another user, e.g. root-owned dirs left by the old
+    busybox prep container or files the server wrote as its uid, are left
+    as they are.
+    """
+    try:
+        if _OWN_UID in (None, 0) or os.stat(path).st_uid == _OWN_UID:
+            os.chmod(path, 0o777)
+    except OSError as e:
+        problems.append(f"{path}: {e.strerror}")
+
+
+def _ensure_dir(path: str, problems: list[str]) -> bool:
+    """Create ``path`` if missing and make it world-writable if it is ours."""
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        pass
+    except OSError as e:
+        problems.append(f"{path}: {e.strerror}")
+        return False
+    _make_world_writable(path, problems)
+    return True
+
+
+def _seed_asset_dir(source: str, target: str, problems: list[str]) -> None:
+    """Copy the ``source`` tree into ``target``, touching only copied paths.
+
+    Like ``cp -r``, symlinks are copied as links rather than followed. Whatever
+    the server added under ``target`` at runtime is not walked or chmodded.
+    Paths that cannot be written are reported in ``problems``.
+    """
+    for root, dirs, files in os.walk(source):
+        rel = os.path.relpath(root, source)
+        dest_root = target if rel == "." else os.path.join(target, rel)
+        if not _ensure_dir(dest_root, problems):
+            dirs.clear()
+            continue
+        for name in dirs + files:
+            src = os.path.join(root, name)
+            dest = os.path.join(dest_root, name)
+            if os.path.islink(src):
+                try:
+                    os.symlink(os.readlink(src), dest)
+                except FileExistsError:
+                    pass
+                except OSError as e:
+                    problems.append(f"{dest}: {e.strerror}")
+            elif name in files:
+                try:
+                    # Contents only: copying metadata would chmod files we don't own
+                    shutil.copyfile(src, dest)
+                except OSError as e:
+                    problems.append(f"{dest}: {e.strerror}")
+                    continue
+                _make_world_writable(dest, problems)
+
+
+def prepare_instance_data(data_dir: str) -> list[str]:
+    """Seed an instance's server data dir with the plugins and skins.
+
+    The Minecraft container runs as a non-root user, so the data dir and the
+    copied assets are made world-writable. Returns the paths that could not
+    be created, copied or chmodded; seeding never raises for them.
+    """
+    problems: list[str] = []
+    _make_world_writable(data_dir, problems)
+    for name in _SERVER_ASSET_DIRS:
+        source = f"{_PROJECT_ROOT}/{name}"
+        target = f"{data_dir}/{name}"
+        if os.path.isdir(source):
+            _seed_asset_dir(source, target, problems)
+        else:
+            _ensure_dir(target, problems)
+    return problems
+
+
+def prepare_instance_dirs(instance_id: int, bases: tuple[str, ...]) -> list[str]:
+    """Create one instance's per-instance dirs and seed its server data dir.
+
+    ``bases`` must already exist, with the server data base first. Each
+    per-instance dir is a direct child of a base, so one mkdir suffices.
+    Returns the paths that could not be prepared.
+    """
+    problems: list[str] = []
+    for base in bases:
+        try:
+            os.mkdir(f"{base}/{instance_id}")
+        except FileExistsError:
+            pass
+        except OSError as e:
+            problems.append(f"{base}/{instance_id}: {e.strerror}")
+    return problems + prepare_instance_data(f"{bases[0]}/{instance_id}")
+
+
+def instance_cpusets(
+    start_cpu: int,
+    end_cpu: int,
+    physical_core0_cpus: set[int],
+    cpu_ids: Optional[list[int]] = None,
+) -> tuple[str, str, str]:
+    """Return the (instance, camera_alpha, camera_bravo) cpusets for a range.
+
+    Physical core 0 siblings are excluded (they handle system interrupts) and
+    the instance's cores are split between the two camera bots. With
+    ``cpu_ids`` the range indexes into that list instead of naming CPU ids.
+    """
+    (alpha_start, alpha_end), (bravo_start, bravo_end) = split_cpu_range(start_cpu, end_cpu)
+    return (
+        cpuset_string_excluding(start_cpu, end_cpu, physical_core0_cpus, cpu_ids),
+        cpuset_string_excluding(alpha_start, alpha_end, physical_core0_cpus, cpu_ids),
+        cpuset_string_excluding(bravo_start, bravo_end, physical_core0_cpus, cpu_ids),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _yaml_dumper():
+    """Import PyYAML on first use, so --help and --format json never load it.
+
+    Returns the ``yaml`` module and the fastest available safe dumper.
+    """
+    import yaml
+
+    try:
+        from yaml import CSafeDumper as dumper
+    except ImportError:  # PyYAML built without libyaml
+        from yaml import SafeDumper as dumper
+    return yaml, dumper
+
+
+def dump_compose_yaml(config: dict) -> bytes:
+    """Render a compose config as UTF-8 YAML, in insertion order.
+
+    This dump is nearly all of the per-instance cost (~90% under cProfile):
+    the libyaml dumper only replaces the emitter, and PyYAML's
+    representer/resolver still walk every node in Python. A wide ``width``
+    keeps long commands and env values on one line instead of folding them.
+    """
+    yaml, dumper = _yaml_dumper()
+    return yaml.dump(
+        config,
+        Dumper=dumper,
+        default_flow_style=False,
+        sort_keys=False,
+        allow_unicode=True,
+        width=4096,
+        encoding="utf-8",
+    )
+
+
+def dump_compose_json(config: dict) -> bytes:
+    """Render a compose config as indented UTF-8 JSON, in insertion order.
+
+    Uses orjson when it is installed, otherwise the stdlib encoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(config, option=orjson.OPT_INDENT_2)
+    return json.dumps(config, indent=2).encode("utf-8")
+
+
+# Process umask, read once at import (setting it to query it is not thread-safe)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_if_changed(path: str, content: bytes) -> bool:
+    """Write ``content`` to ``path`` unless the file already holds exactly it.
+
+    The new content goes to a sibling temp file, is fsynced and is moved into
+    place with ``os.replace`` so readers (``docker compose up`` started right
+    after generation) never see a partially written compose file.
+    Returns True if the file was written.
+    """
+    try:
+        if os.stat(path).st_size == len(content):
+            with open(path, "rb") as fh:
+                if fh.read() == content:
+                    return False
+    except FileNotFoundError:
+        pass
+    head, name = os.path.split(path)
+    # Unique temp name: concurrent runs may target the same compose dir.
+    # Unbuffered fd: the whole buffer goes out in a single write() call
+    fd, tmp_path = tempfile.mkstemp(
+        dir=head or ".", prefix=f".{name}.", suffix=".tmp"
+    )
+    try:
+        try:
+            # mkstemp creates 0600; give the file the usual umask-based mode
+            os.fchmod(fd, 0o666 & ~_UMASK)
+            view = memoryview(content)
+            while view:
+                view = view[os.write(fd, view):]
+            # Make the data durable before the rename publishes it
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def pin_worker(cpu_queue: "multiprocessing.Queue") -> None:
+    """Pool initializer: pin this worker process to the next CPU in ``cpu_queue``.
+
+    The queue holds one CPU per worker, so workers land on distinct CPUs.
+    Pinning is best effort and skipped where the platform does not support it.
+    """
+    try:
+        cpu = cpu_queue.get(timeout=5)
+    except queue.Empty:
+        return
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError:
+            pass
+
+
+def emit_instance(
+    i: int,
+    world_type: str,
+    cpusets: Optional[tuple[str, str, str]],
+    base_timestamp: int,
+    opts: dict,
+) -> tuple[str, bool]:
+    """Generate, render and write the compose file for one instance.
+
+    Runs in a worker process, so it only takes picklable arguments: ``opts``
+    is ``vars(args)`` from ``main`` and ``cpusets`` comes from
+    ``instance_cpusets``. Returns the path of the compose file and whether it
+    was (re)written.
+    """
+    # Unpack the instance's cpusets if CPU pinning is enabled
+    instance_cpuset, camera_alpha_cpuset, camera_bravo_cpuset = cpusets or (None, None, None)
+
+    # For flat worlds, pick this instance's terrain for GENERATOR_SETTINGS
+    generator_settings = None
+    if world_type == "flat":
+        generator_settings = _FLAT_GENERATOR_SETTINGS[i % len(_FLAT_GENERATOR_SETTINGS)]
+
+    # Calculate GPU assignment for this instance (round-robin across available GPUs)
+    gpu_device_id = i % opts["gpu_count"] if opts["enable_gpu"] else None
+
+    config = generate_compose_config(
+        i,
+        opts["base_port"],
+        opts["base_rcon_port"],
+        opts["receiver_port"],
+        opts["coord_port"],
+        opts["data_dir"],
+        opts["output_dir"],
+        opts["num_episodes"],
+        opts["episode_start_id"],
+        opts["bootstrap_wait_time"],
+        opts["episode_category"],
+        opts["episode_types"],
+        opts["iterations_num_per_episode"],
+        opts["smoke_test"],
+        opts["viewer_rendering_disabled"],
+        world_type,
+        str(opts["render_distance"]),
+        str(opts["simulation_distance"]),
+        str(opts["graphics_mode"]),
+        # camera args
+        opts["camera_output_alpha_base"],
+        opts["camera_output_bravo_base"],
+        opts["camera_data_alpha_base"],
+        opts["camera_data_bravo_base"],
+        opts["camera_alpha_vnc_base"],
+        opts["camera_alpha_novnc_base"],
+        opts["camera_bravo_vnc_base"],
+        opts["camera_bravo_novnc_base"],
+        opts["display_base"],
+        opts["vnc_step"],
+        opts["display_step"],
+        # CPU pinning
+        cpuset=instance_cpuset,
+        cpuset_camera_alpha=camera_alpha_cpuset,
+        cpuset_camera_bravo=camera_bravo_cpuset,
+        # GPU settings
+        enable_gpu=bool(opts["enable_gpu"]),
+        gpu_device_id=gpu_device_id,
+        gpu_mode=opts["gpu_mode"],
+        # Eval options
+        eval_time_set_day=opts["eval_time_set_day"],
+        # Flatland options
+        flatland_world_disable_structures=bool(opts["flatland_world_disable_structures"]),
+        generator_settings=generator_settings,
+        base_timestamp=base_timestamp,
+    )
+
+    # Plain strings: no PurePath construction per file
+    compose_file = os.path.join(
+        opts["compose_dir"], f"docker-compose-{i:03d}.yml"
+    )
+
+    # Render compose file in memory; it is written once below.
+    if opts["format"] == "json":
+        # JSON is valid YAML, so compose reads it from the same .yml path
+        content = dump_compose_json(config)
+    else:
+        content = dump_compose_yaml(config)
+
+    written = write_if_changed(compose_file, content)
+
+    return compose_file, written
+
+
+@functools.lru_cache(maxsize=None)
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser; cached for programmatic reuse."""
     parser = argparse.ArgumentParser(
         description="Generate Docker Compose files for parallel Minecraft data "
         "collection"
@@ -773,7 +1175,34 @@ def main():
         choices=[0, 1],
         help="Only use second logical cores (latter half of CPUs) to avoid hyperthreading (default: 0)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Processes used to render compose files; 0 uses one per usable CPU, "
+        "1 renders in this process (default: 0)",
+    )
+    parser.add_argument(
+        "--ignore_seed_errors",
+        type=int,
+        default=0,
+        choices=[0, 1],
+        help="Still write the compose files when some plugins/skins could not "
+        "be seeded into the data dirs. Seeding happens here, not on compose "
+        "up, so re-run this script to re-seed changed assets (default: 0)",
+    )
+    parser.add_argument(
+        "--format",
+        default="yaml",
+        choices=["yaml", "json"],
+        help="Compose file serialization; JSON is valid YAML and much faster "
+        "to generate (default: yaml)",
+    )
+    return parser
 
+
+def main():
+    parser = build_parser()
     args = parser.parse_args()
     # Ensure required dirs are absolute
     args.output_dir = absdir(args.output_dir)
@@ -782,24 +1211,15 @@ def main():
     args.camera_output_bravo_base = absdir(args.camera_output_bravo_base)
 
     # Defaults for camera data bases
-    project_root = str(Path(__file__).resolve().parent)
     if args.camera_data_alpha_base is None:
-        args.camera_data_alpha_base = absdir(
-            os.path.join(project_root, "camera", "data_alpha")
-        )
+        args.camera_data_alpha_base = absdir(f"{_CAMERA_DIR}/data_alpha")
     else:
         args.camera_data_alpha_base = absdir(args.camera_data_alpha_base)
     if args.camera_data_bravo_base is None:
-        args.camera_data_bravo_base = absdir(
-            os.path.join(project_root, "camera", "data_bravo")
-        )
+        args.camera_data_bravo_base = absdir(f"{_CAMERA_DIR}/data_bravo")
     else:
         args.camera_data_bravo_base = absdir(args.camera_data_bravo_base)
 
-    # Create compose directory
-    compose_dir = Path(args.compose_dir)
-    compose_dir.mkdir(exist_ok=True)
-
     # Determine number of instances and world plan
     use_split = (args.num_flatland_world > 0) or (args.num_normal_world > 0)
     if use_split:
@@ -811,32 +1231,68 @@ def main():
         total_instances = args.instances
         world_plan = ["normal"] * total_instances
 
+    # Collision validation for camera ports, before anything is written
+    check_port_collisions(
+        {
+            "alpha VNC": args.camera_alpha_vnc_base,
+            "alpha noVNC": args.camera_alpha_novnc_base,
+            "bravo VNC": args.camera_bravo_vnc_base,
+            "bravo noVNC": args.camera_bravo_novnc_base,
+        },
+        args.vnc_step,
+        total_instances,
+    )
+
+    # Create compose directory
+    compose_dir = Path(args.compose_dir)
+    compose_dir.mkdir(exist_ok=True)
+
     # Calculate CPU pinning if enabled
     cpu_ranges: list[tuple[int, int]] = []
+    cpuset_plan: list[tuple[str, str, str]] = []
     physical_core0_cpus: set[int] = set()
     if args.enable_cpu_pinning:
-        total_cpus = args.total_cpus if args.total_cpus else os.cpu_count()
-        if total_cpus is None:
+        # Without an explicit --total_cpus, pin within this process's
+        # affinity mask; ranges then index into cpu_ids rather than naming
+        # CPU ids, so a cgroup/taskset that excludes CPU 0.. is honoured.
+        cpu_ids = None if args.total_cpus else get_usable_cpus()
+        total_cpus = args.total_cpus if args.total_cpus else len(cpu_ids)
+        if not total_cpus:
             print("Warning: Could not detect CPU count, disabling CPU pinning")
             args.enable_cpu_pinning = 0
         else:
             if args.no_hyper_threading:
-                cpu_ranges = get_no_hyper_threading_cpu_ranges(total_cpus, total_instances)
                 # No need to exclude physical_core0_cpus when using only second logical cores
                 physical_core0_cpus = set()
-                usable_cpus = total_cpus - total_cpus // 2
-                print(f"CPU pinning enabled (no hyperthreading): using {usable_cpus} cores (CPUs {total_cpus // 2}-{total_cpus - 1}) across {total_instances} instances")
+                # Prefer the real SMT sibling layout; fall back to assuming
+                # the second threads are the upper half of the CPU ids.
+                core_cpus = get_second_thread_cpus(
+                    cpu_ids if cpu_ids is not None else range(total_cpus)
+                )
+                if core_cpus is not None:
+                    cpu_ids = core_cpus
+                    usable_cpus = len(cpu_ids)
+                    cpu_ranges = calculate_cpu_ranges(usable_cpus, total_instances)
+                    usable_cs = cpuset_string_excluding(0, usable_cpus - 1, set(), cpu_ids)
+                else:
+                    cpu_ranges = get_no_hyper_threading_cpu_ranges(total_cpus, total_instances)
+                    usable_cpus = total_cpus - total_cpus // 2
+                    usable_cs = cpuset_string_excluding(total_cpus // 2, total_cpus - 1, set(), cpu_ids)
+                print(f"CPU pinning enabled (no hyperthreading): using {usable_cpus} cores (CPUs {usable_cs}) across {total_instances} instances")
             else:
                 cpu_ranges = calculate_cpu_ranges(total_cpus, total_instances)
                 physical_core0_cpus = get_physical_core0_cpus()
                 print(f"CPU pinning enabled: {total_cpus} cores across {total_instances} instances")
                 print(f"  Excluding physical core 0 siblings: {physical_core0_cpus}")       
-            for idx, (start, end) in enumerate(cpu_ranges):
-                (alpha_start, alpha_end), (bravo_start, bravo_end) = split_cpu_range(start, end)
-                instance_cs = cpuset_string_excluding(start, end, physical_core0_cpus)
-                alpha_cs = instance_cs # cpuset_string_excluding(alpha_start, alpha_end, physical_core0_cpus)
-                bravo_cs = instance_cs #cpuset_string_excluding(bravo_start, bravo_end, physical_core0_cpus)
-                print(f"  Instance {idx}: {instance_cs} (camera_alpha: {alpha_cs}, camera_bravo: {bravo_cs})")
+            cpuset_plan = [
+                instance_cpusets(start, end, physical_core0_cpus, cpu_ids)
+                for start, end in cpu_ranges
+            ]
+            # One print per section rather than per instance
+            print("\n".join(
+                f"  Instance {idx}: {instance_cs} (camera_alpha: {alpha_cs}, camera_bravo: {bravo_cs})"
+                for idx, (instance_cs, alpha_cs, bravo_cs) in enumerate(cpuset_plan)
+            ))
 
     # GPU configuration validation
     if args.enable_gpu and args.gpu_count > 1:
@@ -851,136 +1307,90 @@ def main():
     if args.enable_gpu:
         print(f"GPU rendering enabled: {args.gpu_count} GPUs available, mode={args.gpu_mode}")
         print(f"  Instances will be distributed round-robin across GPUs")
-        for i in range(total_instances):
-            gpu_id = i % args.gpu_count
-            print(f"    Instance {i}: GPU {gpu_id}")
+        print("\n".join(
+            f"    Instance {i}: GPU {i % args.gpu_count}" for i in range(total_instances)
+        ))
     
     print(f"Generating {total_instances} Docker Compose configurations...")
 
-    for i in range(total_instances):
-        world_type = world_plan[i]
-        # Calculate cpuset string for this instance if CPU pinning is enabled
-        instance_cpuset = None
-        camera_alpha_cpuset = None
-        camera_bravo_cpuset = None
-        if args.enable_cpu_pinning and cpu_ranges:
-            start_cpu, end_cpu = cpu_ranges[i]
-            # Exclude physical core 0 siblings (they handle system interrupts)
-            instance_cpuset = cpuset_string_excluding(start_cpu, end_cpu, physical_core0_cpus)
-            # Split the instance's cores between the two camera bots
-            (alpha_start, alpha_end), (bravo_start, bravo_end) = split_cpu_range(start_cpu, end_cpu)
-            camera_alpha_cpuset = cpuset_string_excluding(alpha_start, alpha_end, physical_core0_cpus)
-            camera_bravo_cpuset = cpuset_string_excluding(bravo_start, bravo_end, physical_core0_cpus)
-        
-        # Calculate GPU assignment for this instance (round-robin across available GPUs)
-        gpu_device_id = i % args.gpu_count if args.enable_gpu else None
-        
-        config = generate_compose_config(
-            i,
-            args.base_port,
-            args.base_rcon_port,
-            args.receiver_port,
-            args.coord_port,
-            args.data_dir,
-            args.output_dir,
-            args.num_episodes,
-            args.episode_start_id,
-            args.bootstrap_wait_time,
-            args.episode_category,
-            args.episode_types,
-            args.iterations_num_per_episode,
-            args.smoke_test,
-            args.viewer_rendering_disabled,
-            world_type,
-            str(args.render_distance),
-            str(args.simulation_distance),
-            str(args.graphics_mode),
-            # camera args
-            args.camera_output_alpha_base,
-            args.camera_output_bravo_base,
-            args.camera_data_alpha_base,
-            args.camera_data_bravo_base,
-            args.camera_alpha_vnc_base,
-            args.camera_alpha_novnc_base,
-            args.camera_bravo_vnc_base,
-            args.camera_bravo_novnc_base,
-            args.display_base,
-            args.vnc_step,
-            args.display_step,
-            # CPU pinning
-            cpuset=instance_cpuset,
-            cpuset_camera_alpha=camera_alpha_cpuset,
-            cpuset_camera_bravo=camera_bravo_cpuset,
-            # GPU settings
-            enable_gpu=bool(args.enable_gpu),
-            gpu_device_id=gpu_device_id,
-            gpu_mode=args.gpu_mode,
-            # Eval options
-            eval_time_set_day=args.eval_time_set_day,
-            # Flatland options
-            flatland_world_disable_structures=bool(args.flatland_world_disable_structures),
-        )
-
-        # Write compose file
-        compose_file = compose_dir / f"docker-compose-{i:03d}.yml"
-        with open(compose_file, "w") as f:
-            yaml.dump(config, f, default_flow_style=False, sort_keys=False)
-
-        # For flat worlds, inject generator settings into the compose file
-        if world_type == "flat":
-            terrain_options = [
-                ("plains", "grass_block"),
-                ("windswept_hills", "grass_block"),
-                ("snowy_plains", "snow"),
-                ("desert", "sand"),
-                ("desert", "red_sand"),
-            ]
-            biome, surface_block = terrain_options[i % len(terrain_options)]
-            terrain_settings = generate_terrain_settings(biome, surface_block)
-
-            layers_json = []
-            for layer in terrain_settings["layers"]:
-                layer_str = (
-                    f'{{ "block": "{layer["block"]}", "height": {layer["height"]} }}'
-                )
-                layers_json.append(layer_str)
-            layers_str = ",\n    ".join(layers_json)
-            biome_val = terrain_settings["biome"]
-            terrain_json = f'{{\n  "layers": [\n    {layers_str}\n  ],\n  "biome": "{biome_val}"\n}}'
-            newline = "\n"
-            terrain_multiline = (
-                f">-\n        {terrain_json.replace(newline, newline + '        ')}"
-            )
-
-            with open(compose_file, "r") as f:
-                content = f.read()
-            content = re.sub(
-                r"GENERATOR_SETTINGS: TERRAIN_SETTINGS_PLACEHOLDER",
-                f"GENERATOR_SETTINGS: {terrain_multiline}",
-                content,
+    # Instances are independent, so render and write them in parallel.
+    # Results come back in instance order for the log output below.
+    opts = vars(args)
+    # One timestamp for the whole run; instance ids keep the seeds distinct
+    base_timestamp = int(time.time())
+    if not (args.enable_cpu_pinning and cpuset_plan):
+        cpuset_plan = [None] * total_instances
+    # Create the shared output dir and the per-instance base dirs up front;
+    # only these need makedirs' ancestor walk.
+    instance_bases = (
+        args.data_dir,
+        args.camera_output_alpha_base,
+        args.camera_output_bravo_base,
+        args.camera_data_alpha_base,
+        args.camera_data_bravo_base,
+    )
+    for d in {args.output_dir, *instance_bases}:
+        os.makedirs(d, exist_ok=True)
+    # Per-instance mkdirs and asset copies are independent I/O, so overlap them
+    with ThreadPoolExecutor(max_workers=min(8, total_instances) or 1) as executor:
+        problems = [
+            p
+            for instance_problems in executor.map(
+                prepare_instance_dirs, range(total_instances), repeat(instance_bases)
             )
-            with open(compose_file, "w") as f:
-                f.write(content)
-
-        # Create necessary directories
-        os.makedirs(f"{args.data_dir}/{i}", exist_ok=True)
-        # Camera output/data per-instance dirs
-        cp = camera_paths(
-            i,
-            args.camera_output_alpha_base,
-            args.camera_output_bravo_base,
-            args.camera_data_alpha_base,
-            args.camera_data_bravo_base,
+            for p in instance_problems
+        ]
+    if problems:
+        # Typically leftovers owned by root or the server's uid from earlier runs
+        print(
+            f"{'Warning' if args.ignore_seed_errors else 'Error'}: could not "
+            f"prepare {len(problems)} path(s) under the instance dirs (owned by "
+            "another user?); fix ownership or remove them"
+            + ("" if args.ignore_seed_errors else ", or pass --ignore_seed_errors 1")
+            + ":"
         )
-        os.makedirs(cp["alpha_output_host"], exist_ok=True)
-        os.makedirs(cp["bravo_output_host"], exist_ok=True)
-        os.makedirs(cp["alpha_data_host"], exist_ok=True)
-        os.makedirs(cp["bravo_data_host"], exist_ok=True)
-
-        print(f"Generated: {compose_file}")
+        print("\n".join(f"  {p}" for p in problems[:10]))
+        if len(problems) > 10:
+            print(f"  ... and {len(problems) - 10} more")
+        if not args.ignore_seed_errors:
+            # Don't write configs that would start on a half-seeded data dir
+            raise SystemExit(1)
 
-    # Create shared output directory
-    os.makedirs(args.output_dir, exist_ok=True)
+    emit_args = (
+        range(total_instances),
+        world_plan,
+        cpuset_plan,
+        repeat(base_timestamp),
+        repeat(opts),
+    )
+    affinity_cpus = get_usable_cpus()
+    max_workers = max(1, min(args.workers or len(affinity_cpus), total_instances))
+    pool_kw = {}
+    if args.enable_cpu_pinning and any(cpuset_plan):
+        # Keep render workers off the CPUs the instances are pinned to, one
+        # worker per leftover CPU; with none left over, leave them unpinned.
+        instance_cpus = {
+            cpu
+            for instance_cs, _, _ in cpuset_plan
+            for cpu in parse_cpu_list(instance_cs)
+        }
+        free_cpus = [cpu for cpu in affinity_cpus if cpu not in instance_cpus]
+        if free_cpus:
+            max_workers = min(max_workers, len(free_cpus))
+            cpu_queue = multiprocessing.Queue()
+            for cpu in free_cpus[:max_workers]:
+                cpu_queue.put(cpu)
+            pool_kw = {"initializer": pin_worker, "initargs": (cpu_queue,)}
+    if max_workers == 1:
+        # A render takes a few ms, so small runs are faster without a pool
+        results = list(map(emit_instance, *emit_args))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, **pool_kw) as executor:
+            results = list(executor.map(emit_instance, *emit_args))
+    print("\n".join(
+        f"{'Generated' if written else 'Unchanged'}: {compose_file}"
+        for compose_file, written in results
+    ))
 
     print(f"\nGenerated {total_instances} configurations in {compose_dir}/")
     print("Published port ranges (host network):")
@@ -990,23 +1400,6 @@ def main():
     print(
         f"  RCON ports: {args.base_rcon_port}-{args.base_rcon_port + total_instances - 1}"
     )
-    # Collision validation for camera ports
-    alpha_vncs = {
-        args.camera_alpha_vnc_base + args.vnc_step * i for i in range(total_instances)
-    }
-    alpha_novncs = {
-        args.camera_alpha_novnc_base + args.vnc_step * i for i in range(total_instances)
-    }
-    bravo_vncs = {
-        args.camera_bravo_vnc_base + args.vnc_step * i for i in range(total_instances)
-    }
-    bravo_novncs = {
-        args.camera_bravo_novnc_base + args.vnc_step * i for i in range(total_instances)
-    }
-    assert len(alpha_vncs) == total_instances, "alpha VNC port collisions detected"
-    assert len(alpha_novncs) == total_instances, "alpha noVNC port collisions detected"
-    assert len(bravo_vncs) == total_instances, "bravo VNC port collisions detected"
-    assert len(bravo_novncs) == total_instances, "bravo noVNC port collisions detected"
     print(
         f"  Camera Alpha noVNC: {args.camera_alpha_novnc_base}..{args.camera_alpha_novnc_base + args.vnc_step * (total_instances - 1)}"
     )
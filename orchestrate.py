@@ -11,6 +11,7 @@ import sys
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cached_property
 from pathlib import Path
 from typing import Dict, List, Optional, Set
 
@@ -18,6 +19,16 @@ import signal
 import yaml
 import shutil
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
+
+try:
+    import docker
+except ImportError:  # optional; status() falls back to the docker CLI
+    docker = None
+
 
 class LogManager:
     def __init__(self, base_dir: Path, compose_bin: Optional[List[str]] = None):
@@ -95,16 +106,23 @@ def detect_compose_bin() -> List[str]:
 
 
 class InstanceManager:
-    def __init__(self, compose_dir="compose_configs", build_images=False, logs_dir="logs"):
+    def __init__(
+        self,
+        compose_dir="compose_configs",
+        build_images=False,
+        logs_dir="logs",
+        max_parallel: Optional[int] = None,
+    ):
         self.compose_dir = Path(compose_dir)
         self.running_instances = {}
         self.compose_bin = detect_compose_bin()
         self.logs_dir = Path(logs_dir)
         self.log_manager = LogManager(self.logs_dir, self.compose_bin)
         self.build_images = build_images
+        # Cap on concurrent docker compose calls; None runs one per instance
+        self.max_parallel = max_parallel
         # service base names as generated by generate_compose.py
         self.service_bases = [
-            "prep_data_instance_{i}",
             "mc_instance_{i}",
             "sender_alpha_instance_{i}",
             "sender_bravo_instance_{i}",
@@ -118,9 +136,32 @@ class InstanceManager:
         ]
         self.instance_logs: Dict[str, Dict[str, subprocess.Popen]] = {}
 
-    def get_compose_files(self):
-        """Get all Docker Compose files in the config directory."""
-        return sorted(list(self.compose_dir.glob("docker-compose-*.yml")))
+    def _pool_size(self, num_tasks: int) -> int:
+        """Number of worker threads for ``num_tasks`` docker compose calls.
+
+        The calls mostly wait on the daemon and healthchecks, so they all run
+        at once unless ``--max-parallel`` asks for a cap.
+        """
+        return max(1, min(num_tasks, self.max_parallel or num_tasks))
+
+    @cached_property
+    def compose_files(self) -> List[Path]:
+        """All Docker Compose files in the config directory.
+
+        Listed once per run; the directory does not change while a command runs.
+        """
+        try:
+            with os.scandir(self.compose_dir) as entries:
+                # DirEntry name/type come from the directory read; no extra stats
+                return sorted(
+                    Path(entry.path)
+                    for entry in entries
+                    if entry.name.startswith("docker-compose-")
+                    and entry.name.endswith(".yml")
+                    and entry.is_file()
+                )
+        except FileNotFoundError:
+            return []
 
     def build_instance(self, compose_file):
         """Build Docker images for a single instance."""
@@ -137,7 +178,11 @@ class InstanceManager:
                 "build",
             ]
             result = subprocess.run(
-                cmd, capture_output=True, text=True, cwd=self.compose_dir.parent
+                cmd,
+                stdout=subprocess.DEVNULL,  # only stderr is reported, on failure
+                stderr=subprocess.PIPE,
+                text=True,
+                cwd=self.compose_dir.parent,
             )
 
             if result.returncode == 0:
@@ -173,7 +218,11 @@ class InstanceManager:
                 "-d",
             ]
             result = subprocess.run(
-                cmd, capture_output=True, text=True, cwd=self.compose_dir.parent
+                cmd,
+                stdout=subprocess.DEVNULL,  # only stderr is reported, on failure
+                stderr=subprocess.PIPE,
+                text=True,
+                cwd=self.compose_dir.parent,
             )
 
             if result.returncode == 0:
@@ -213,7 +262,11 @@ class InstanceManager:
                 "-v",
             ]
             result = subprocess.run(
-                cmd, capture_output=True, text=True, cwd=self.compose_dir.parent
+                cmd,
+                stdout=subprocess.DEVNULL,  # only stderr is reported, on failure
+                stderr=subprocess.PIPE,
+                text=True,
+                cwd=self.compose_dir.parent,
             )
 
             if result.returncode == 0:
@@ -247,7 +300,11 @@ class InstanceManager:
                 sender_bravo,
             ]
             result = subprocess.run(
-                cmd, capture_output=True, text=True, cwd=self.compose_dir.parent
+                cmd,
+                stdout=subprocess.DEVNULL,  # only stderr is reported, on failure
+                stderr=subprocess.PIPE,
+                text=True,
+                cwd=self.compose_dir.parent,
             )
             
             if result.returncode == 0:
@@ -262,7 +319,7 @@ class InstanceManager:
 
     def start_all(self):
         """Start all instances in parallel, wait for completion, then stop."""
-        compose_files = self.get_compose_files()
+        compose_files = self.compose_files
         total_instances = len(compose_files)
 
         if total_instances == 0:
@@ -276,7 +333,7 @@ class InstanceManager:
 
         # Start all instances simultaneously
         started_instances = {}
-        with ThreadPoolExecutor(max_workers=total_instances) as executor:
+        with ThreadPoolExecutor(max_workers=self._pool_size(total_instances)) as executor:
             futures = {
                 executor.submit(self.start_instance, cf): cf for cf in compose_files
             }
@@ -313,7 +370,7 @@ class InstanceManager:
 
     def stop_all(self):
         """Stop all instances."""
-        compose_files = self.get_compose_files()
+        compose_files = self.compose_files
         total_instances = len(compose_files)
 
         if total_instances == 0:
@@ -322,7 +379,7 @@ class InstanceManager:
 
         print(f"Stopping {total_instances} instances...")
 
-        with ThreadPoolExecutor(max_workers=total_instances) as executor:
+        with ThreadPoolExecutor(max_workers=self._pool_size(total_instances)) as executor:
             futures = {
                 executor.submit(self.stop_instance, cf): cf for cf in compose_files
             }
@@ -337,7 +394,7 @@ class InstanceManager:
 
     def status(self):
         """Show status of all instances."""
-        compose_files = self.get_compose_files()
+        compose_files = self.compose_files
 
         if not compose_files:
             print("No Docker Compose files found.")
@@ -346,61 +403,68 @@ class InstanceManager:
         print(f"Found {len(compose_files)} configured instances:")
         print("\nChecking status...")
 
+        try:
+            states_by_project = self._container_states_by_project()
+        except Exception as e:
+            for compose_file in compose_files:
+                print(f"❓ {compose_file.stem}: error checking status - {e}")
+            print(f"\nSummary: 0/{len(compose_files)} instances running")
+            return
+
         running_count = 0
         for compose_file in compose_files:
             instance_name = compose_file.stem
-            try:
-                cmd = [
-                    "docker",
-                    "compose",
-                    "-p",
-                    instance_name,
-                    "-f",
-                    str(compose_file),
-                    "ps",
-                    "-q",
-                ]
-                result = subprocess.run(
-                    cmd, capture_output=True, text=True, cwd=self.compose_dir.parent
-                )
-
-                if result.stdout.strip():
-                    # Check if containers are actually running
-                    container_ids = result.stdout.strip().split("\n")
-                    container_ids = [
-                        cid for cid in container_ids if cid.strip()
-                    ]  # Filter empty strings
-
-                    running_containers = 0
-                    for container_id in container_ids:
-                        inspect_cmd = [
-                            "docker",
-                            "inspect",
-                            "--format",
-                            "{{.State.Status}}",
-                            container_id,
-                        ]
-                        inspect_result = subprocess.run(
-                            inspect_cmd, capture_output=True, text=True
-                        )
-                        if inspect_result.stdout.strip() == "running":
-                            running_containers += 1
-
-                    if running_containers > 0:
-                        print(
-                            f"🟢 {instance_name}: {running_containers} containers running"
-                        )
-                        running_count += 1
-                    else:
-                        print(f"🟡 {instance_name}: containers exist but not running")
+            states = states_by_project.get(instance_name)
+            if states:
+                running_containers = states.count("running")
+                if running_containers > 0:
+                    print(f"🟢 {instance_name}: {running_containers} containers running")
+                    running_count += 1
                 else:
-                    print(f"🔴 {instance_name}: stopped")
-
-            except Exception as e:
-                print(f"❓ {instance_name}: error checking status - {e}")
+                    print(f"🟡 {instance_name}: containers exist but not running")
+            else:
+                print(f"🔴 {instance_name}: stopped")
 
         print(f"\nSummary: {running_count}/{len(compose_files)} instances running")
 
+    def _container_states_by_project(self) -> Dict[str, List[str]]:
+        """Map each compose project name to the states of its containers.
+
+        Talks to the daemon through the Docker SDK when it is installed,
+        otherwise uses a single ``docker ps`` for all instances instead of
+        one ``compose ps`` plus one ``inspect`` per container.  Like
+        ``compose ps``, exited containers are left out, so an instance
+        with nothing but exited containers reads as stopped.
+        """
+        if docker is not None:
+            try:
+                containers = docker.from_env().containers.list(
+                    filters={"label": "com.docker.compose.project"}
+                )
+            except Exception:
+                pass  # e.g. no socket access from the SDK; use the CLI
+            else:
+                states_by_project: Dict[str, List[str]] = {}
+                for container in containers:
+                    project = container.labels["com.docker.compose.project"]
+                    states_by_project.setdefault(project, []).append(container.status)
+                return states_by_project
+
+        cmd = [
+            "docker",
+            "ps",
+            "--filter",
+            "label=com.docker.compose.project",
+            "--format",
+            '{{.Label "com.docker.compose.project"}}\t{{.State}}',
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        states_by_project = {}
+        for line in result.stdout.splitlines():
+            project, _, state = line.partition("\t")
+            states_by_project.setdefault(project, []).append(state)
+        return states_by_project
+
     def logs(self, instance_pattern=None, follow=False, tail: int = 50):
         """Tail saved log files captured by LogManager.
 
@@ -418,11 +482,11 @@ class InstanceManager:
         if not instances:
             # Fallback behavior
             print("No saved logs found; falling back to docker compose logs")
-            compose_files = self.get_compose_files()
+            compose_files = self.compose_files
             if instance_pattern:
                 compose_files = [cf for cf in compose_files if instance_pattern in cf.stem]
-            for compose_file in compose_files:
-                cmd = [
+            cmds = [
+                [
                     *self.compose_bin,
                     "-p",
                     compose_file.stem,
@@ -432,7 +496,25 @@ class InstanceManager:
                     "--tail",
                     "50",
                 ]
-                subprocess.run(cmd, cwd=self.compose_dir.parent)
+                for compose_file in compose_files
+            ]
+            if not cmds:
+                return
+
+            def fetch(cmd):
+                return subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    errors="replace",
+                    cwd=self.compose_dir.parent,
+                )
+
+            # Fetch concurrently; print in file order so outputs never interleave
+            with ThreadPoolExecutor(max_workers=min(8, len(cmds))) as executor:
+                for result in executor.map(fetch, cmds):
+                    sys.stdout.write(result.stdout)
+                    sys.stderr.write(result.stderr)
             return
 
         for inst_dir in instances:
@@ -460,7 +542,7 @@ class InstanceManager:
     def _print_vnc_urls(self, compose_file: Path, instance_name: str) -> None:
         try:
             with open(compose_file, "r", encoding="utf-8") as fh:
-                data = yaml.safe_load(fh)
+                data = yaml.load(fh, Loader=SafeLoader)
             # try to locate env NOVNC_PORT for alpha/bravo
             ports = {}
             for svc_name, svc in (data.get("services") or {}).items():
@@ -700,6 +782,13 @@ def main():
         default=4,
         help="Number of parallel workers for postprocess (default: 4)",
     )
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=None,
+        help="Max concurrent docker compose calls for start/stop "
+        "(default: one per instance)",
+    )
     parser.add_argument(
         "--comparison-video",
         action="store_true",
@@ -717,7 +806,12 @@ def main():
     )
     args = parser.parse_args()
 
-    manager = InstanceManager(args.compose_dir, build_images=args.build, logs_dir=args.logs_dir)
+    manager = InstanceManager(
+        args.compose_dir,
+        build_images=args.build,
+        logs_dir=args.logs_dir,
+        max_parallel=args.max_parallel,
+    )
 
     if args.command == "start":
         manager.start_all()
@@ -5,96 +5,105 @@ Reads logs and extracts frame count information from lines like:
 📊 Target: 300 frames | Actual: 321 | Difference: 21 frames
 """
 
+import mmap
 import re
 import sys
-from collections import defaultdict
+from dataclasses import dataclass
+from operator import itemgetter
+
+# Every interesting line is "[Bot] " followed by exactly one of these, so a
+# single alternation replaces three searches. Compiled as bytes so it can scan
+# the memory-mapped log directly. Nothing in the pattern matches a newline
+# and each match runs to the end of its line ($), so finditer yields at most
+# one match per line, the leftmost, just as a search() per line would.
+# Bytes patterns make \w ASCII-only, so the bot name is any run of
+# non-space, non-bracket bytes and non-ASCII names still match.
+# Examples:
+#   [Bravo] 📊 Target: 256 frames | Actual: 229 | Difference: -27 frames | Actions Duration: 11.43s
+#   [Bravo] 📊 Final Duration: 14.96s | Final Frames: 299 | Actions Duration: 11.43s | Idle Duration: 3.57s
+#   [Bravo] Starting episode 12
+_LINE_RE = re.compile(
+    r'(?m)\[(?P<bot>[^\s\[\]]+)\] (?:'
+    r'📊 Target: (?P<target>\d+) frames \| Actual: (?P<actual>\d+) \| Difference: (?P<difference>[+-]?\d+) frames \| Actions Duration: (?P<actions>[\d.]+)s'
+    r'|📊 Final Duration: (?P<final>[\d.]+)s \| Final Frames: (?P<final_frames>\d+) \| Actions Duration: (?P<final_actions>[\d.]+)s \| Idle Duration: (?P<idle>[\d.]+)s'
+    r'|Starting episode (?P<episode>\d+)'
+    r')[^\n]*$'.encode('utf-8')
+)
+
+@dataclass(slots=True)
+class PendingEpisode:
+    """Frame count data for a bot, waiting for its final duration line."""
+    episode: int
+    bot: str
+    target: int
+    actual: int
+    difference: int
+    actions_duration: float
 
 def parse_log_file(log_path='episode_run_frames.txt'):
     """Parse log file and extract frame count data."""
     
-    # Pattern to match the frame count line with actions duration
-    # Example: [Bravo] 📊 Target: 256 frames | Actual: 229 | Difference: -27 frames | Actions Duration: 11.43s
-    pattern = r'\[(\w+)\] 📊 Target: (\d+) frames \| Actual: (\d+) \| Difference: ([+-]?\d+) frames \| Actions Duration: ([\d.]+)s'
-    
-    # Pattern to match the final duration line
-    # Example: [Bravo] 📊 Final Duration: 14.96s | Final Frames: 299 | Actions Duration: 11.43s | Idle Duration: 3.57s
-    final_pattern = r'\[(\w+)\] 📊 Final Duration: ([\d.]+)s \| Final Frames: (\d+) \| Actions Duration: ([\d.]+)s \| Idle Duration: ([\d.]+)s'
-    
-    # Also extract episode number from previous lines
-    episode_pattern = r'\[(\w+)\] Starting episode (\d+)'
-    
     episodes = []
     current_episodes = {}  # Track current episode number per bot
     pending_episodes = {}  # Track episodes waiting for final duration line
     
     try:
-        with open(log_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        with open(log_path, 'rb') as f:
+            log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
     except FileNotFoundError:
         print(f"❌ Error: File '{log_path}' not found")
         return []
+    except ValueError:  # mmap refuses empty files
+        return []
     
-    # Process lines sequentially
-    for i, line in enumerate(lines):
-        # Update current episode number if we see a new episode starting
-        ep_match = re.search(episode_pattern, line)
-        if ep_match:
-            bot_name = ep_match.group(1)
-            episode_num = int(ep_match.group(2))
-            current_episodes[bot_name] = episode_num
+    # Let the regex engine walk the mapped file in C; no per-line objects are
+    # created. Groups are bytes: int()/float() take them as is, only the bot
+    # name needs decoding.
+    with log:
+        for match in _LINE_RE.finditer(log):
+            bot_name = match['bot'].decode('utf-8', 'replace')
+        
+            if match['episode'] is not None:
+                # Update current episode number if we see a new episode starting
+                current_episodes[bot_name] = int(match['episode'])
         
-        # Look for frame count line with actions duration
-        match = re.search(pattern, line)
-        if match:
-            bot_name = match.group(1)
-            target_frames = int(match.group(2))
-            actual_frames = int(match.group(3))
-            difference = int(match.group(4))
-            actions_duration = float(match.group(5))
-            
-            # Get episode number
-            episode_num = current_episodes.get(bot_name, -1)
-            
-            # Store pending episode data (waiting for final duration line)
-            pending_episodes[bot_name] = {
-                'episode': episode_num,
-                'bot': bot_name,
-                'target': target_frames,
-                'actual': actual_frames,
-                'difference': difference,
-                'actions_duration': actions_duration,
-                'idle_duration': None,
-                'final_frames': None,
-                'final_duration': None,
-                'actions_frames': None,
-                'idle_frames': None
-            }
+            elif match['target'] is not None:
+                # Frame count line with actions duration; store it until the
+                # final duration line for the same bot arrives
+                pending_episodes[bot_name] = PendingEpisode(
+                    episode=current_episodes.get(bot_name, -1),
+                    bot=bot_name,
+                    target=int(match['target']),
+                    actual=int(match['actual']),
+                    difference=int(match['difference']),
+                    actions_duration=float(match['actions']),
+                )
         
-        # Look for final duration line
-        final_match = re.search(final_pattern, line)
-        if final_match:
-            bot_name = final_match.group(1)
-            final_duration = float(final_match.group(2))
-            final_frames = int(final_match.group(3))
-            actions_duration = float(final_match.group(4))
-            idle_duration = float(final_match.group(5))
-            
-            # Update pending episode with final data
-            if bot_name in pending_episodes:
-                pending_episodes[bot_name]['final_duration'] = final_duration
-                pending_episodes[bot_name]['final_frames'] = final_frames
-                pending_episodes[bot_name]['idle_duration'] = idle_duration
-                
-                # Calculate frames from durations (20 FPS)
-                pending_episodes[bot_name]['actions_frames'] = round(actions_duration * 20)
-                pending_episodes[bot_name]['idle_frames'] = round(idle_duration * 20)
-                
-                # Add completed episode to list
-                episodes.append(pending_episodes[bot_name])
-                del pending_episodes[bot_name]
+            elif bot_name in pending_episodes:
+                # Final duration line: complete the pending episode
+                pending = pending_episodes.pop(bot_name)
+                actions_duration = float(match['final_actions'])
+                idle_duration = float(match['idle'])
+                episodes.append({
+                    'episode': pending.episode,
+                    'bot': pending.bot,
+                    'target': pending.target,
+                    'actual': pending.actual,
+                    'difference': pending.difference,
+                    'actions_duration': pending.actions_duration,
+                    'idle_duration': idle_duration,
+                    'final_frames': int(match['final_frames']),
+                    'final_duration': float(match['final']),
+                    # Calculate frames from durations (20 FPS)
+                    'actions_frames': round(actions_duration * 20),
+                    'idle_frames': round(idle_duration * 20),
+                })
     
     return episodes
 
+# Summary table row; the sign flag renders the difference as +N / -N
+_format_row = "{:<10} {:<10} {:<15} {:<15} {:<12} {:<10} {:<+10d}".format
+
 def print_summary_table(episodes):
     """Print a summary table of all episodes."""
     if not episodes:
@@ -113,35 +122,59 @@ def print_summary_table(episodes):
     print("-"*140)
     
     # Sort by episode number
-    sorted_episodes = sorted(episodes, key=lambda x: x['episode'])
+    # Timsort finishes an already ordered log in one linear pass, and the
+    # C-level itemgetter avoids a lambda call per episode. Copy rather than
+    # sort in place so the statistics below sum in log order.
+    sorted_episodes = sorted(episodes, key=itemgetter('episode'))
     
+    rows = []
     for ep in sorted_episodes:
         actions_str = f"{ep['actions_duration']:.2f}s/{ep.get('actions_frames', 0)}f" if ep['actions_duration'] else "N/A"
         idle_str = f"{ep['idle_duration']:.2f}s/{ep.get('idle_frames', 0)}f" if ep['idle_duration'] else "N/A"
         total_str = f"{ep['final_duration']:.2f}s/{ep.get('final_frames', 0)}f" if ep['final_duration'] else "N/A"
-        diff_str = f"{ep['difference']:+d}" if ep['difference'] >= 0 else str(ep['difference'])
         
-        print(f"{ep['episode']:<10} "
-              f"{ep['bot']:<10} "
-              f"{actions_str:<15} "
-              f"{idle_str:<15} "
-              f"{total_str:<12} "
-              f"{ep['target']:<10} "
-              f"{diff_str:<10}")
+        rows.append(_format_row(ep['episode'], ep['bot'], actions_str, idle_str,
+                                total_str, ep['target'], ep['difference']))
+    
+    # One write for the whole table instead of a print per row
+    sys.stdout.write("\n".join(rows) + "\n")
     
     print("-"*140)
     
     # Statistics
     if episodes:
-        avg_actions = sum(e['actions_duration'] for e in episodes if e['actions_duration']) / len([e for e in episodes if e['actions_duration']])
-        avg_idle = sum(e['idle_duration'] for e in episodes if e['idle_duration']) / len([e for e in episodes if e['idle_duration']])
-        avg_total = sum(e['final_duration'] for e in episodes if e['final_duration']) / len([e for e in episodes if e['final_duration']])
-        avg_actions_frames = sum(e.get('actions_frames', 0) for e in episodes) / len(episodes)
-        avg_idle_frames = sum(e.get('idle_frames', 0) for e in episodes) / len(episodes)
-        avg_final_frames = sum(e.get('final_frames', 0) for e in episodes) / len(episodes)
-        avg_diff = sum(abs(e['difference']) for e in episodes) / len(episodes)
-        min_frames = min(e['actual'] for e in episodes)
-        max_frames = max(e['actual'] for e in episodes)
+        # Accumulate everything in a single pass over the episodes
+        n = len(episodes)
+        sum_actions = sum_idle = sum_total = 0
+        n_actions = n_idle = n_total = 0
+        sum_actions_frames = sum_idle_frames = sum_final_frames = sum_diff = 0
+        min_frames = max_frames = episodes[0]['actual']
+        for e in episodes:
+            if e['actions_duration']:
+                sum_actions += e['actions_duration']
+                n_actions += 1
+            if e['idle_duration']:
+                sum_idle += e['idle_duration']
+                n_idle += 1
+            if e['final_duration']:
+                sum_total += e['final_duration']
+                n_total += 1
+            sum_actions_frames += e.get('actions_frames', 0)
+            sum_idle_frames += e.get('idle_frames', 0)
+            sum_final_frames += e.get('final_frames', 0)
+            sum_diff += abs(e['difference'])
+            if e['actual'] < min_frames:
+                min_frames = e['actual']
+            elif e['actual'] > max_frames:
+                max_frames = e['actual']
+        
+        avg_actions = sum_actions / n_actions
+        avg_idle = sum_idle / n_idle
+        avg_total = sum_total / n_total
+        avg_actions_frames = sum_actions_frames / n
+        avg_idle_frames = sum_idle_frames / n
+        avg_final_frames = sum_final_frames / n
+        avg_diff = sum_diff / n
         
         print()
         print("STATISTICS:")
@@ -14,15 +14,25 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+import zipfile
 from collections import Counter
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import cv2
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is the fallback
+    orjson = None
 
 # ---------------------------------------------------------------------------
 # Manual override: set to True to allow the legacy computed-index alignment
@@ -35,6 +45,13 @@ ALLOW_LEGACY_ALIGNMENT = False
 # episode actions).
 _BOUNDARY_GRACE_SEC = 10.0
 
+# Upper bound on a single ffprobe run over a recording.
+_FFPROBE_TIMEOUT_SEC = 120
+
+# Forward gaps of up to this many frames are decoded through rather than
+# seeked over when extracting frames.
+_MAX_GRAB_SKIP_FRAMES = 256
+
 
 @dataclass
 class AlignmentInput:
@@ -47,17 +64,32 @@ class AlignmentInput:
     margin_end: float    # unused but kept for backward compatibility
 
 
-def _load_actions(path: Path) -> List[Dict[str, Any]]:
+def _read_json(path: Path) -> Any:
+    """Load a JSON file, with orjson when available (parses bytes, no decode)."""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
     with path.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
+        return json.load(fh)
+
+
+def _write_json(path: Path, obj: Any) -> None:
+    """Write ``obj`` as JSON, with orjson when available."""
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(obj))
+        return
+    with path.open("w", encoding="utf-8") as fh:
+        json.dump(obj, fh)
+
+
+def _load_actions(path: Path) -> List[Dict[str, Any]]:
+    data = _read_json(path)
     if not isinstance(data, list) or not data:
         raise ValueError(f"Action file {path} is empty or invalid")
     return data
 
 
 def _ensure_camera_meta(path: Path) -> Dict[str, Any]:
-    with path.open("r", encoding="utf-8") as fh:
-        meta = json.load(fh)
+    meta = _read_json(path)
     for key in ("start_epoch_seconds", "fps", "recording_path"):
         if key not in meta:
             raise ValueError(f"Camera metadata {path} missing '{key}'")
@@ -68,10 +100,19 @@ def _ensure_camera_meta(path: Path) -> Dict[str, Any]:
 # Per-frame timestamp extraction (wallclock mode)
 # ---------------------------------------------------------------------------
 
-def _extract_frame_timestamps(recording_path: Path) -> Optional[List[float]]:
+def _parse_pts_lines(lines: Iterable[bytes]) -> Iterable[float]:
+    """Yield the numeric PTS values from ffprobe ``csv=p=0`` output lines."""
+    for line in lines:
+        try:
+            yield float(line)  # float() strips whitespace
+        except ValueError:
+            continue  # blank line or "N/A"
+
+
+def _extract_frame_timestamps(recording_path: Path) -> Optional[np.ndarray]:
     """Extract per-frame PTS (in seconds) from an MKV using ffprobe.
 
-    Returns a **sorted** list of floats (one per video frame) or *None* if
+    Returns a **sorted** float64 array (one entry per video frame) or *None* if
     extraction fails.  When the MKV was recorded with
     ``-use_wallclock_as_timestamps 1 -copyts``, these values will be absolute
     Unix-epoch seconds (e.g. 1738540000.123).
@@ -79,7 +120,7 @@ def _extract_frame_timestamps(recording_path: Path) -> Optional[List[float]]:
     Sorting is necessary because ``ffprobe -show_entries packet=pts_time``
     returns timestamps in *decode* order, which differs from presentation
     order when B-frames are used.  Sorting restores presentation order so
-    that index *i* in the returned list corresponds to frame *i* as decoded
+    that index *i* in the returned array corresponds to frame *i* as decoded
     by ``cv2.VideoCapture``.
     """
     cmd = [
@@ -91,30 +132,38 @@ def _extract_frame_timestamps(recording_path: Path) -> Optional[List[float]]:
         str(recording_path),
     ]
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
     except FileNotFoundError:
         print("[align] ffprobe not found; falling back to legacy alignment", file=sys.stderr)
         return None
-    except subprocess.TimeoutExpired:
+
+    # Enforce the timeout from a timer so stdout can be parsed while ffprobe
+    # is still running; killing it ends the read loop below.
+    timed_out = threading.Event()
+
+    def _kill_on_timeout() -> None:
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(_FFPROBE_TIMEOUT_SEC, _kill_on_timeout)
+    timer.start()
+    try:
+        with proc.stdout:
+            timestamps = np.fromiter(_parse_pts_lines(proc.stdout), dtype=np.float64)
+        returncode = proc.wait()
+    finally:
+        timer.cancel()
+
+    if timed_out.is_set():
         print("[align] ffprobe timed out; falling back to legacy alignment", file=sys.stderr)
         return None
 
-    if result.returncode != 0:
-        print(f"[align] ffprobe failed (rc={result.returncode}); falling back to legacy alignment",
+    if returncode != 0:
+        print(f"[align] ffprobe failed (rc={returncode}); falling back to legacy alignment",
               file=sys.stderr)
         return None
 
-    timestamps: List[float] = []
-    for line in result.stdout.strip().splitlines():
-        line = line.strip()
-        if not line or line.lower() == "n/a":
-            continue
-        try:
-            timestamps.append(float(line))
-        except ValueError:
-            continue
-
-    if not timestamps:
+    if not timestamps.size:
         return None
 
     # Sort to convert from decode order to presentation order (handles
@@ -125,8 +174,48 @@ def _extract_frame_timestamps(recording_path: Path) -> Optional[List[float]]:
     return timestamps
 
 
+def _cached_frame_timestamps(recording_path: Path) -> Optional[np.ndarray]:
+    """``_extract_frame_timestamps`` memoized in a ``<recording>.pts.npz`` sidecar.
+
+    The cache is keyed by the recording's mtime and size, so a re-recorded
+    file is probed again.  Reading and writing the cache is best effort.
+    """
+    st = recording_path.stat()
+    key = np.array([st.st_mtime_ns, st.st_size], dtype=np.int64)
+    cache_path = recording_path.with_name(recording_path.name + ".pts.npz")
+    try:
+        with np.load(cache_path) as cached:
+            if np.array_equal(cached["key"], key):
+                return cached["pts"]
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        pass  # missing, stale or unreadable cache: probe again
+
+    timestamps = _extract_frame_timestamps(recording_path)
+    if timestamps is not None:
+        # Unique temp name: parallel workers may cache the same recording
+        tmp_name = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                dir=cache_path.parent,
+                prefix=f".{cache_path.name}.",
+                suffix=".tmp",
+                delete=False,
+            ) as fh:
+                tmp_name = fh.name
+                np.savez(fh, pts=timestamps, key=key)
+            os.replace(tmp_name, cache_path)
+        except OSError:
+            # e.g. read-only recording directory or a full disk
+            if tmp_name is not None:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+    return timestamps
+
+
 def _has_wallclock_timestamps(
-    frame_timestamps: List[float],
+    frame_timestamps: np.ndarray,
     camera_meta: Dict[str, Any],
 ) -> bool:
     """Heuristic: wallclock PTS values are large Unix-epoch numbers (> 1e9).
@@ -137,7 +226,7 @@ def _has_wallclock_timestamps(
     if camera_meta.get("wallclock_timestamps"):
         return True
     # Heuristic: first PTS > 1 billion ≈ 2001-09-09 → definitely epoch time
-    if frame_timestamps and frame_timestamps[0] > 1e9:
+    if len(frame_timestamps) and frame_timestamps[0] > 1e9:
         return True
     return False
 
@@ -148,9 +237,9 @@ def _has_wallclock_timestamps(
 
 def _match_actions_to_frames(
     actions: List[Dict[str, Any]],
-    frame_timestamps: List[float],
+    frame_timestamps: np.ndarray,
     fps: float,
-) -> Tuple[List[int], Dict[str, Any]]:
+) -> Tuple[List[int], Dict[str, Any], np.ndarray]:
     """Match each action to the first video frame at or after the action time.
 
     Both ``action_times`` (from ``epochTime``) and ``frame_timestamps`` are
@@ -162,38 +251,34 @@ def _match_actions_to_frames(
     This avoids additive drift -- after the duplicate the sequences resync
     immediately.
 
-    Returns ``(frame_indices, diagnostics)`` where *frame_indices* has one
-    entry per matched action (the index into the recording to extract) and
-    *diagnostics* is a dict with alignment quality stats.
+    Returns ``(frame_indices, diagnostics, action_times)`` where
+    *frame_indices* has one entry per matched action (the index into the
+    recording to extract), *diagnostics* is a dict with alignment quality
+    stats and *action_times* holds the matched actions' ``epochTime`` values
+    so callers don't re-read them from the action dicts.
     """
     n_actions = len(actions)
     n_frames = len(frame_timestamps)
-    action_times = [float(a["epochTime"]) for a in actions]
-
-    frame_indices: List[int] = []
-    frame_ptr = 0
-
-    # Track diagnostics
-    time_deltas: List[float] = []      # frame_time - effective_action_time
-    unmatched_actions_end = 0          # actions after last available frame
+    action_times = np.fromiter(
+        (float(a["epochTime"]) for a in actions), dtype=np.float64, count=n_actions,
+    )
+    frame_ts = np.asarray(frame_timestamps, dtype=np.float64)
 
-    for action_idx, action_time in enumerate(action_times):
-        # Advance frame_ptr to the first frame at or after action_time.
-        # frame_ptr never goes backwards, so this is O(n+m) overall.
-        while frame_ptr < n_frames and frame_timestamps[frame_ptr] < action_time:
-            frame_ptr += 1
+    # First frame at or after each action time, found by binary search.  The
+    # frame pointer never goes backwards, so carry the running maximum (only
+    # matters if action times are out of order).  A frame may be matched by
+    # several actions (dropped-frame case): frames are not consumed.
+    first_at_or_after = np.searchsorted(frame_ts, action_times, side="left")
+    np.maximum.accumulate(first_at_or_after, out=first_at_or_after)
 
-        if frame_ptr >= n_frames:
-            # No more frames -- remaining actions are unmatched at the end
-            unmatched_actions_end = n_actions - action_idx
-            break
+    # Actions after the last available frame are unmatched at the end
+    n_matched = int(np.searchsorted(first_at_or_after, n_frames, side="left"))
+    unmatched_actions_end = n_actions - n_matched
+    matched_frames = first_at_or_after[:n_matched]
 
-        # Record the match.  Do NOT advance frame_ptr: the same frame may
-        # be the correct match for the next action too (dropped-frame case).
-        matched_frame = frame_ptr
-        delta = frame_timestamps[matched_frame] - action_time
-        time_deltas.append(delta)
-        frame_indices.append(matched_frame)
+    # frame_time - effective_action_time for every match
+    time_deltas = frame_ts[matched_frames] - action_times[:n_matched]
+    frame_indices: List[int] = matched_frames.tolist()
 
     # --- Compute boundary statistics ---
     skipped_frames_start = 0
@@ -204,12 +289,11 @@ def _match_actions_to_frames(
 
     # Count actions whose time falls before the first frame
     unmatched_actions_start = 0
-    if frame_timestamps and action_times:
-        for t in action_times:
-            if t < frame_timestamps[0]:
-                unmatched_actions_start += 1
-            else:
-                break
+    if n_frames and n_actions:
+        at_or_after_start = action_times >= frame_ts[0]
+        unmatched_actions_start = (
+            int(at_or_after_start.argmax()) if at_or_after_start.any() else n_actions
+        )
 
     # --- Check for duplicate frame usage (indicates dropped frames) ---
     frame_usage = Counter(frame_indices)
@@ -218,33 +302,24 @@ def _match_actions_to_frames(
     # --- Check for interior unconsumed frames ---
     # Frames within _BOUNDARY_GRACE_SEC of recording start/end are OK.
     # Any other unconsumed frame is flagged.
-    consumed_set = set(frame_indices)
-    rec_start = frame_timestamps[0] if frame_timestamps else 0.0
-    rec_end = frame_timestamps[-1] if frame_timestamps else 0.0
-    interior_unconsumed: List[int] = []
-    for i in range(n_frames):
-        if i in consumed_set:
-            continue
-        t = frame_timestamps[i]
-        if (t - rec_start) <= _BOUNDARY_GRACE_SEC:
-            continue  # within start grace period
-        if (rec_end - t) <= _BOUNDARY_GRACE_SEC:
-            continue  # within end grace period
-        interior_unconsumed.append(i)
+    rec_start = frame_ts[0] if n_frames else 0.0
+    rec_end = frame_ts[-1] if n_frames else 0.0
+    consumed = np.zeros(n_frames, dtype=bool)
+    consumed[matched_frames] = True
+    in_grace = (
+        ((frame_ts - rec_start) <= _BOUNDARY_GRACE_SEC)  # start grace period
+        | ((rec_end - frame_ts) <= _BOUNDARY_GRACE_SEC)  # end grace period
+    )
+    interior_unconsumed_count = int(np.count_nonzero(~consumed & ~in_grace))
 
     # --- Check for dropped frames (large inter-frame gaps) ---
     # A gap significantly larger than 1/fps suggests x11grab missed a frame.
     expected_interval = 1.0 / fps
     gap_threshold = expected_interval * 1.8  # e.g. 90ms for 20fps (50ms expected)
-    dropped_frame_gaps: List[Dict[str, Any]] = []
-    for i in range(1, n_frames):
-        gap = frame_timestamps[i] - frame_timestamps[i - 1]
-        if gap > gap_threshold and (frame_timestamps[i - 1] - rec_start) > _BOUNDARY_GRACE_SEC:
-            dropped_frame_gaps.append({
-                "between_frames": [i - 1, i],
-                "gap_sec": round(gap, 4),
-                "expected_frames_missed": round(gap / expected_interval) - 1,
-            })
+    gaps = np.diff(frame_ts)
+    dropped_frame_gaps = int(np.count_nonzero(
+        (gaps > gap_threshold) & ((frame_ts[:-1] - rec_start) > _BOUNDARY_GRACE_SEC)
+    ))
 
     diagnostics = {
         "n_actions": n_actions,
@@ -254,16 +329,16 @@ def _match_actions_to_frames(
         "skipped_frames_end": skipped_frames_end,
         "unmatched_actions_start": unmatched_actions_start,
         "unmatched_actions_end": unmatched_actions_end,
-        "mean_delta_sec": (sum(time_deltas) / len(time_deltas)) if time_deltas else 0.0,
-        "max_abs_delta_sec": max(abs(d) for d in time_deltas) if time_deltas else 0.0,
-        "min_delta_sec": min(time_deltas) if time_deltas else 0.0,
-        "max_delta_sec": max(time_deltas) if time_deltas else 0.0,
+        "mean_delta_sec": float(time_deltas.mean()) if n_matched else 0.0,
+        "max_abs_delta_sec": float(np.abs(time_deltas).max()) if n_matched else 0.0,
+        "min_delta_sec": float(time_deltas.min()) if n_matched else 0.0,
+        "max_delta_sec": float(time_deltas.max()) if n_matched else 0.0,
         "duplicate_frame_count": len(duplicate_frames),
-        "interior_unconsumed_count": len(interior_unconsumed),
-        "dropped_frame_gaps": len(dropped_frame_gaps),
+        "interior_unconsumed_count": interior_unconsumed_count,
+        "dropped_frame_gaps": dropped_frame_gaps,
     }
 
-    return frame_indices, diagnostics
+    return frame_indices, diagnostics, action_times[:n_matched]
 
 
 # ---------------------------------------------------------------------------
@@ -341,9 +416,15 @@ def _write_frames_by_index(
             writer.write(last_frame)
             cache_hits += 1
         else:
-            # Only seek if we need to go backwards or skip frames
-            # For sequential reads, just continue reading
-            if frame_idx != last_frame_idx + 1:
+            # Short forward gaps are decoded through with grab(), which skips
+            # the BGR conversion; only jump backwards or far ahead with a seek,
+            # which restarts decoding from the previous keyframe.
+            skip = frame_idx - last_frame_idx - 1
+            if 0 < skip <= _MAX_GRAB_SKIP_FRAMES:
+                for _ in range(skip):
+                    if not cap.grab():
+                        break  # the read below reports the failure
+            elif skip != 0:
                 cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
                 seeks_count += 1
             
@@ -359,7 +440,9 @@ def _write_frames_by_index(
             
             writer.write(frame)
             last_frame_idx = frame_idx
-            last_frame = frame.copy()  # Cache for potential duplicates
+            # Cache for potential duplicates.  cap.read() allocates a new
+            # array per call, so keeping a reference is safe without a copy.
+            last_frame = frame
     
     writer.release()
     cap.release()
@@ -375,13 +458,19 @@ def _write_frames_by_index(
 def _build_action_mapping_wallclock(
     actions: List[Dict[str, Any]],
     frame_indices: List[int],
-    frame_timestamps: List[float],
+    frame_timestamps: np.ndarray,
+    action_times: np.ndarray,
 ) -> List[Dict[str, Any]]:
-    """Build frame-to-action mapping for wallclock-timestamp alignment."""
+    """Build frame-to-action mapping for wallclock-timestamp alignment.
+
+    *action_times* are the matched actions' ``epochTime`` values as returned
+    by ``_match_actions_to_frames``.
+    """
     mapping: List[Dict[str, Any]] = []
-    for action_idx, (entry, frame_idx) in enumerate(zip(actions, frame_indices)):
-        action_time_sec = float(entry.get("epochTime", 0.0))
-        frame_time_sec = frame_timestamps[frame_idx] if frame_idx < len(frame_timestamps) else 0.0
+    # Gather both time columns in bulk; tolist() yields plain Python floats
+    frame_times = frame_timestamps[frame_indices].tolist()
+    rows = zip(actions, frame_indices, action_times.tolist(), frame_times)
+    for action_idx, (entry, frame_idx, action_time_sec, frame_time_sec) in enumerate(rows):
         mapping.append(
             {
                 "action_index": action_idx,
@@ -473,7 +562,7 @@ def align_recording(config: AlignmentInput) -> Dict[str, Any]:
     # ------------------------------------------------------------------
     # Extract per-frame timestamps and decide alignment mode
     # ------------------------------------------------------------------
-    frame_timestamps = _extract_frame_timestamps(recording_path)
+    frame_timestamps = _cached_frame_timestamps(recording_path)
     use_wallclock = (
         frame_timestamps is not None
         and _has_wallclock_timestamps(frame_timestamps, camera_meta)
@@ -502,7 +591,7 @@ def align_recording(config: AlignmentInput) -> Dict[str, Any]:
     assert frame_timestamps is not None  # for type checker
     print(f"[align] Using wallclock timestamps ({len(frame_timestamps)} frames extracted)")
 
-    frame_indices, diagnostics = _match_actions_to_frames(
+    frame_indices, diagnostics, action_times = _match_actions_to_frames(
         actions, frame_timestamps, fps,
     )
 
@@ -514,9 +603,8 @@ def align_recording(config: AlignmentInput) -> Dict[str, Any]:
 
     _write_frames_by_index(recording_path, frame_indices, fps, config.output_video_path)
 
-    action_times_sec = [float(a["epochTime"]) for a in matched_actions]
     mapping = _build_action_mapping_wallclock(
-        matched_actions, frame_indices, frame_timestamps,
+        matched_actions, frame_indices, frame_timestamps, action_times,
     )
 
     output_metadata = {
@@ -527,18 +615,17 @@ def align_recording(config: AlignmentInput) -> Dict[str, Any]:
         "alignment_mode": "wallclock",
         "fps": fps,
         "camera_start_time_sec": camera_start_time_sec,
-        "first_frame_time_sec": frame_timestamps[0] if frame_timestamps else None,
-        "last_frame_time_sec": frame_timestamps[-1] if frame_timestamps else None,
+        "first_frame_time_sec": float(frame_timestamps[0]),
+        "last_frame_time_sec": float(frame_timestamps[-1]),
         "total_video_frames": len(frame_timestamps),
-        "first_action_time_sec": min(action_times_sec) if action_times_sec else None,
-        "last_action_time_sec": max(action_times_sec) if action_times_sec else None,
+        "first_action_time_sec": float(action_times.min()),
+        "last_action_time_sec": float(action_times.max()),
         "diagnostics": diagnostics,
         "frame_mapping": mapping,
     }
 
     config.output_metadata_path.parent.mkdir(parents=True, exist_ok=True)
-    with config.output_metadata_path.open("w", encoding="utf-8") as fh:
-        json.dump(output_metadata, fh)
+    _write_json(config.output_metadata_path, output_metadata)
 
     # Print diagnostics summary
     d = diagnostics
@@ -606,8 +693,7 @@ def _align_legacy(
     }
 
     config.output_metadata_path.parent.mkdir(parents=True, exist_ok=True)
-    with config.output_metadata_path.open("w", encoding="utf-8") as fh:
-        json.dump(output_metadata, fh)
+    _write_json(config.output_metadata_path, output_metadata)
 
     return output_metadata
 